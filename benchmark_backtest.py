@@ -0,0 +1,257 @@
+# benchmark_backtest.py
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import tracemalloc
+import functools
+import numpy as np
+import pandas as pd
+
+import volatility
+from synthetic_data import generate_dataset
+from utilities import parse_option_tickers, find_option_by_delta, get_option_price, calculate_time_to_maturity
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_nifty import backtest_options as backtest_options_nifty
+from options_backtest_vectorized import backtest_options_vectorized
+from tradebook import TradebookAggregator, trades_to_records
+
+# benchmark_backtest.py
+#
+# Times the backtest at several data scales on synthetic data (synthetic_data.py), phase by
+# phase: load (reading the raw CSV / pickle files), preprocess (parsing option tickers,
+# building the option chain index and the volatility series), backtest (the per-day loop of
+# each engine, on the preprocessed data) and aggregate (tradebook records and monthly PnL).
+# Throughput is ticker-days per second of backtest time. Peak memory is measured with
+# tracemalloc in a second pass, so its overhead stays out of the timings. Results are written
+# to Benchmarks/results.json and compared against Benchmarks/baseline.json when it exists;
+# run with --save to make the current results the baseline. Backtest timings are of cold runs,
+# every strike selected afresh; warm timings are of a repeated run, as in a parameter sweep,
+# with the selections (and the vectorized engine's price paths) kept on the chains. Every scale
+# also checks that each kernel and vectorized engine's tradebook equals its loop engine's,
+# trade for trade, on the parity_params sets; the run exits with status 1 when one does not.
+#
+#   python benchmark_backtest.py [small|medium|large ...] [--save]
+
+# name: (tickers, years, strikes per day)
+scales = {
+    'small': (2, 1, 10),
+    'medium': (4, 3, 20),
+    'large': (8, 5, 30),
+}
+benchmark_dir = "Benchmarks"
+repeats = 3  # Each timing is the best of this many runs
+
+total_exposure = 700000
+params = dict(dte=20, sl=2, target_delta=0.35, max_reentries=1, reentry_type="asap", option_type="call")
+# Parameter sets of the parity check: the timed one, cost re-entries and a tight SL on puts
+parity_params = [params, dict(params, max_reentries=2, reentry_type="cost"), dict(params, sl=0.5, dte=15, option_type="put")]
+
+import warnings
+# Suppress only SettingWithCopyWarning
+warnings.simplefilter(action="ignore", category=pd.errors.SettingWithCopyWarning)
+
+# engine name: (function, hedged)
+engines = {
+    "loop": (backtest_options, False),
+    "kernel": (functools.partial(backtest_options, engine="kernel"), False),
+    "vectorized": (backtest_options_vectorized, False),
+    "nifty loop": (backtest_options_nifty, True),
+    "nifty kernel": (functools.partial(backtest_options_nifty, engine="kernel"), True),
+}
+# engine name: the loop engine whose tradebook it must reproduce
+parity_engines = {"kernel": "loop", "vectorized": "loop", "nifty kernel": "nifty loop"}
+
+def best_time(function, repeats=repeats):
+    # (best wall time in seconds, last result)
+    best = float('inf')
+    for _ in range(repeats):
+        started = time.perf_counter()
+        result = function()
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+def peak_memory(function):
+    # Peak bytes allocated by Python while function runs
+    tracemalloc.start()
+    try:
+        function()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+# Generate a scale's dataset once under Benchmarks/data/<scale>
+def scale_data(scale):
+    data_dir = f"{benchmark_dir}/data/{scale}"
+    tickers, years, strikes_per_day = scales[scale]
+    if not os.path.exists(f"{data_dir}/nifty_combined_sorted_data.csv"):
+        generate_dataset(data_dir, tickers, years, strikes_per_day)
+    return data_dir, [f'SYN{number:02d}' for number in range(tickers)]
+
+def load_raw(data_dir, tickers):
+    data = {ticker: (pd.read_csv(f'{data_dir}/Stocks_Data/{ticker}_EQ_EOD.csv'), pd.read_csv(f'{data_dir}/Stocks_Data/{ticker}_Opt_EOD.csv'))
+            for ticker in tickers}
+    return data, pd.read_pickle(f'{data_dir}/Nifty_MonthlyI_Opt2019.pkl'), pd.read_csv(f'{data_dir}/nifty_combined_sorted_data.csv')
+
+def preprocess(data, nifty_options_data, nifty_index_data):
+    # Fresh volatility providers, so this phase pays for the volatility series the engines then reuse
+    volatility.volatility_cache.clear()
+    prepared = {}
+    for ticker, (equity_data, options_data) in data.items():
+        option_chain = OptionChainIndex(parse_option_tickers(options_data.copy()))
+        volatility.get_volatility(equity_data, f'{ticker}.EQ-NSE')
+        prepared[ticker] = (equity_data, option_chain)
+    nifty_option_chain = OptionChainIndex(parse_option_tickers(nifty_options_data.copy()))
+    volatility.get_volatility(nifty_index_data, 'NIFTY', close_column='Close')
+    return prepared, nifty_option_chain
+
+def run_engine(engine, prepared, nifty_option_chain, nifty_index_data, start_date, end_date, params=params, cold=True):
+    # A cold run selects its strikes afresh: the chains would otherwise keep the previous run's
+    # selections and prepared arrays
+    function, hedged = engines[engine]
+    if cold:
+        nifty_option_chain.selections.clear()
+    trades = {}
+    for ticker, (equity_data, option_chain) in prepared.items():
+        stock_ticker = f'{ticker}.EQ-NSE'
+        if cold:
+            option_chain.selections.clear()
+            option_chain.prepared.clear()
+        if hedged:
+            trades[ticker] = function(stock_ticker, equity_data, option_chain, nifty_option_chain, nifty_index_data,
+                                      start_date, end_date, total_exposure, **params)
+        else:
+            trades[ticker] = function(stock_ticker, equity_data, option_chain, start_date, end_date, total_exposure, **params)
+    return trades
+
+def aggregate(trades, hedged):
+    pnl_columns = ['Options PNL', 'Nifty Options PNL'] if hedged else ['Options PNL']
+    aggregator = TradebookAggregator(pnl_columns)
+    for ticker_trades in trades.values():
+        aggregator.add(trades_to_records(ticker_trades, hedged))
+    return aggregator.monthly_pnl(), aggregator.yearly_pnl(), aggregator.max_drawdown()
+
+# Whether two runs' trades are identical: same tickers, and per ticker the same records field by field
+def same_trades(trades, reference_trades, hedged):
+    if trades.keys() != reference_trades.keys():
+        return False
+    for ticker in trades:
+        records, reference = trades_to_records(trades[ticker], hedged), trades_to_records(reference_trades[ticker], hedged)
+        if records.dtype != reference.dtype or len(records) != len(reference):
+            return False
+        if not all(np.array_equal(records[name], reference[name]) for name in records.dtype.names):
+            return False
+    return True
+
+def parity(prepared, nifty_option_chain, nifty_index_data, start_date, end_date):
+    # {engine: whether it matches its loop engine on every parity parameter set}
+    run = functools.partial(run_engine, prepared=prepared, nifty_option_chain=nifty_option_chain, nifty_index_data=nifty_index_data,
+                            start_date=start_date, end_date=end_date)
+    return {engine: all(same_trades(run(engine, params=engine_params), run(reference, params=engine_params), engines[engine][1])
+                        for engine_params in parity_params)
+            for engine, reference in parity_engines.items()}
+
+# Per-call timings of the two chain lookups on one day's chain, through the DataFrame API
+def micro_benchmarks(prepared, number=200):
+    equity_data, option_chain = next(iter(prepared.values()))
+    date = equity_data['Date'].iloc[len(equity_data) // 2]
+    options_for_date = option_chain.get(date)
+    spot_price = equity_data['EQ_Close'].iloc[len(equity_data) // 2]
+    time_to_maturity = calculate_time_to_maturity(date)
+    option = find_option_by_delta(options_for_date, date, spot_price, time_to_maturity, 0.3, 0.35)
+    return {
+        'find_option_by_delta': timeit.timeit(lambda: find_option_by_delta(options_for_date, date, spot_price, time_to_maturity, 0.3, 0.35),
+                                              number=number) / number,
+        'get_option_price': timeit.timeit(lambda: get_option_price(options_for_date, option['Strike Price']), number=number) / number,
+    }
+
+def run_scale(scale):
+    data_dir, tickers = scale_data(scale)
+    load_seconds, (data, nifty_options_data, nifty_index_data) = best_time(lambda: load_raw(data_dir, tickers))
+    preprocess_seconds, (prepared, nifty_option_chain) = best_time(lambda: preprocess(data, nifty_options_data, nifty_index_data))
+
+    start_date = min(equity_data['Date'].iloc[0] for equity_data, _ in prepared.values())
+    end_date = max(equity_data['Date'].iloc[-1] for equity_data, _ in prepared.values())
+    ticker_days = sum(len(equity_data) for equity_data, _ in prepared.values())
+    result = {
+        'tickers': len(tickers), 'ticker_days': ticker_days, 'option_rows': sum(len(chain.strikes) for _, chain in prepared.values()),
+        'load_seconds': load_seconds, 'preprocess_seconds': preprocess_seconds, 'engines': {},
+    }
+
+    for engine in engines:
+        hedged = engines[engine][1]
+        run = functools.partial(run_engine, engine, prepared, nifty_option_chain, nifty_index_data, start_date, end_date)
+        run()  # warm-up (compiles the kernel)
+        backtest_seconds, trades = best_time(run)
+        warm_backtest_seconds, _ = best_time(functools.partial(run, cold=False))
+        aggregate_seconds, _ = best_time(lambda: aggregate(trades, hedged))
+        result['engines'][engine] = {
+            'trades': sum(len(ticker_trades) for ticker_trades in trades.values()),
+            'backtest_seconds': backtest_seconds,
+            'warm_backtest_seconds': warm_backtest_seconds,
+            'aggregate_seconds': aggregate_seconds,
+            'ticker_days_per_second': ticker_days / backtest_seconds,
+            'peak_memory_mb': peak_memory(run) / 2 ** 20,
+        }
+    result['load_peak_memory_mb'] = peak_memory(lambda: load_raw(data_dir, tickers)) / 2 ** 20
+    result['preprocess_peak_memory_mb'] = peak_memory(lambda: preprocess(data, nifty_options_data, nifty_index_data)) / 2 ** 20
+    result['micro_seconds'] = micro_benchmarks(prepared)
+    result['parity'] = parity(prepared, nifty_option_chain, nifty_index_data, start_date, end_date)
+    return result
+
+# Current / baseline ratio of every timing and memory figure both runs have (above 1 is slower)
+def compare(results, baseline):
+    rows = []
+    for scale, result in results.items():
+        if scale not in baseline:
+            continue
+        base = baseline[scale]
+        for name in ('load_seconds', 'preprocess_seconds', 'load_peak_memory_mb', 'preprocess_peak_memory_mb'):
+            rows.append({'Scale': scale, 'Engine': '', 'Metric': name, 'Baseline': base[name], 'Current': result[name]})
+        for name, seconds in result['micro_seconds'].items():
+            rows.append({'Scale': scale, 'Engine': '', 'Metric': name, 'Baseline': base['micro_seconds'][name], 'Current': seconds})
+        for engine, figures in result['engines'].items():
+            if engine not in base['engines']:
+                continue
+            for name in ('backtest_seconds', 'aggregate_seconds', 'peak_memory_mb'):
+                rows.append({'Scale': scale, 'Engine': engine, 'Metric': name, 'Baseline': base['engines'][engine][name], 'Current': figures[name]})
+    comparison_df = pd.DataFrame(rows, columns=['Scale', 'Engine', 'Metric', 'Baseline', 'Current'])
+    comparison_df['Ratio'] = comparison_df['Current'] / comparison_df['Baseline']
+    return comparison_df
+
+if __name__ == "__main__":
+    selected = [argument for argument in sys.argv[1:] if not argument.startswith('--')] or list(scales)
+    results = {}
+    for scale in selected:
+        results[scale] = run_scale(scale)
+        result = results[scale]
+        print(f"{scale}: {result['tickers']} tickers, {result['ticker_days']} ticker-days, {result['option_rows']} option rows - "
+              f"load {result['load_seconds']:.2f}s, preprocess {result['preprocess_seconds']:.2f}s")
+        for engine, figures in result['engines'].items():
+            print(f"  {engine:>12}: {figures['backtest_seconds']:.3f}s ({figures['ticker_days_per_second']:,.0f} ticker-days/s), "
+                  f"warm {figures['warm_backtest_seconds']:.3f}s, "
+                  f"aggregate {figures['aggregate_seconds']:.4f}s, peak {figures['peak_memory_mb']:.1f} MB, {figures['trades']} trades")
+        for name, seconds in result['micro_seconds'].items():
+            print(f"  {name}: {seconds * 1e6:.1f} us/call")
+        for engine, matches in result['parity'].items():
+            print(f"  {engine} vs {parity_engines[engine]}: {'identical tradebooks' if matches else 'TRADEBOOKS DIFFER'}")
+
+    results = {'python': platform.python_version(), 'numpy': np.__version__, 'pandas': pd.__version__, **results}
+    os.makedirs(benchmark_dir, exist_ok=True)
+    with open(f"{benchmark_dir}/results.json", 'w') as results_file:
+        json.dump(results, results_file, indent=2)
+
+    baseline_path = f"{benchmark_dir}/baseline.json"
+    if os.path.exists(baseline_path) and '--save' not in sys.argv:
+        with open(baseline_path) as baseline_file:
+            baseline = json.load(baseline_file)
+        print(compare({scale: results[scale] for scale in selected}, baseline).to_string(index=False))
+    if '--save' in sys.argv:
+        with open(baseline_path, 'w') as baseline_file:
+            json.dump(results, baseline_file, indent=2)
+        print(f"Saved baseline to {baseline_path}")
+    if not all(all(results[scale]['parity'].values()) for scale in selected):
+        sys.exit(1)
@@ -0,0 +1,131 @@
+# data_cache.py
+import os
+import json
+import shutil
+import numpy as np
+import pandas as pd
+
+# Bump when the on-disk layout or the preparation of cached frames changes
+CACHE_VERSION = 1
+
+
+# Columnar cache for the EOD input files. On first use a source file is read (and
+# optionally prepared, e.g. option tickers parsed), then written as one .npy file per
+# column next to a meta.json recording the source mtime and size. Later loads memory-map
+# the .npy files instead of parsing the source again; touching or replacing the source
+# invalidates the entry. String columns are stored as int32 codes plus their categories.
+# A load can be narrowed to some columns (with dtypes to cast them to, and string columns
+# kept as categoricals) and to the rows whose Date falls in date_range = (first, last),
+# plus `lookback` rows before it; only those parts of the .npy files are ever read.
+def load_cached(path, reader=pd.read_csv, prepare=None, cache_dir=None, columns=None, dtypes=None, categorical=(), date_range=None, lookback=0):
+    cache_path = cache_entry_path(path, cache_dir)
+    source = source_signature(path)
+    selection = dict(columns=columns, dtypes=dtypes, categorical=categorical, date_range=date_range, lookback=lookback)
+    meta = read_meta(cache_path)
+    if is_current(meta, source):
+        return read_columns(cache_path, meta, **selection)
+
+    data = reader(path)
+    if prepare is not None:
+        data = prepare(data)
+    write_columns(cache_path, data, source)
+    if any([columns, dtypes, categorical, date_range]):
+        return read_columns(cache_path, read_meta(cache_path), **selection)
+    return data
+
+def cache_entry_path(path, cache_dir=None):
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)), '.cache')
+    return os.path.join(cache_dir, os.path.basename(path))
+
+def source_signature(path):
+    stat = os.stat(path)
+    return {'mtime_ns': stat.st_mtime_ns, 'size': stat.st_size}
+
+def is_current(meta, source):
+    return meta is not None and meta['source'] == source and meta['version'] == CACHE_VERSION
+
+def read_meta(cache_path):
+    try:
+        with open(os.path.join(cache_path, 'meta.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def write_columns(cache_path, data, source):
+    columns = []
+    # Built under a per-process name, so workers building the same entry at once never touch
+    # each other's half-written files
+    tmp_path = f'{cache_path}.{os.getpid()}.tmp'
+    shutil.rmtree(tmp_path, ignore_errors=True)
+    os.makedirs(tmp_path)
+    for number, column in enumerate(data.columns):
+        values = data[column]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            kind = 'category'
+            codes, categories = values.cat.codes.to_numpy(), values.cat.categories.to_numpy()
+        elif values.dtype == object or pd.api.types.is_string_dtype(values.dtype):
+            kind = 'string'
+            codes, categories = pd.factorize(values)
+        else:
+            kind = 'array'
+        if kind == 'array':
+            np.save(os.path.join(tmp_path, f'{number}.npy'), values.to_numpy())
+        else:
+            np.save(os.path.join(tmp_path, f'{number}.npy'), codes.astype(np.int32))
+            np.save(os.path.join(tmp_path, f'{number}.categories.npy'), np.asarray(categories).astype(str))
+        columns.append({'name': column, 'kind': kind})
+    with open(os.path.join(tmp_path, 'meta.json'), 'w') as f:
+        json.dump({'version': CACHE_VERSION, 'source': source, 'columns': columns}, f)
+    # Another process building the same entry may have published it first; it is kept (it may
+    # already be being read) and this copy dropped
+    if is_current(read_meta(cache_path), source):
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        return
+    shutil.rmtree(cache_path, ignore_errors=True)
+    try:
+        os.replace(tmp_path, cache_path)
+    except OSError:
+        shutil.rmtree(tmp_path, ignore_errors=True)
+
+def read_columns(cache_path, meta, columns=None, dtypes=None, categorical=(), date_range=None, lookback=0):
+    numbers = {column['name']: number for number, column in enumerate(meta['columns'])}
+    kinds = {column['name']: column['kind'] for column in meta['columns']}
+    rows = slice(None)
+    if date_range is not None:
+        rows = date_rows(cache_path, numbers['Date'], kinds['Date'], date_range, lookback)
+
+    data = {}
+    for name in (columns if columns is not None else numbers):
+        number = numbers[name]
+        values = np.load(os.path.join(cache_path, f'{number}.npy'), mmap_mode='r')[rows]
+        if kinds[name] == 'array':
+            data[name] = values.astype(dtypes[name]) if dtypes and name in dtypes else values
+            continue
+        categories = np.load(os.path.join(cache_path, f'{number}.categories.npy')).astype(object)
+        if kinds[name] == 'category' or name in categorical:
+            data[name] = pd.Categorical.from_codes(values, categories=categories)
+        else:
+            # Missing strings come back as NaN, as read_csv would give them
+            strings = categories[np.maximum(values, 0)] if len(categories) else np.full(len(values), np.nan, dtype=object)
+            strings[np.asarray(values) < 0] = np.nan
+            data[name] = strings
+    return pd.DataFrame(data)
+
+def date_rows(cache_path, number, kind, date_range, lookback=0):
+    # Rows whose Date is within date_range (inclusive), as a slice when they are contiguous.
+    # String dates are compared per distinct date and mapped back through the codes.
+    first, last = date_range
+    values = np.load(os.path.join(cache_path, f'{number}.npy'), mmap_mode='r')
+    if kind == 'array':
+        inside = (values >= first) & (values <= last)
+    else:
+        categories = np.load(os.path.join(cache_path, f'{number}.categories.npy')).astype(object)
+        inside = np.append((categories >= first) & (categories <= last), False)[values]  # code -1 (missing) is outside
+    positions = np.flatnonzero(inside)
+    if not len(positions):
+        return slice(0, 0)
+    start, stop = max(positions[0] - lookback, 0), positions[-1] + 1
+    if inside[positions[0]:stop].all():
+        return slice(start, stop)
+    return np.concatenate([np.arange(start, positions[0]), positions])
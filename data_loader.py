@@ -0,0 +1,80 @@
+# data_loader.py
+import numpy as np
+import pandas as pd
+from datetime import datetime
+
+from utilities import parse_option_tickers
+from data_cache import load_cached
+from instrumentation import NULL_STATS
+
+
+# Columns the backtests read. Option tickers are parsed into Strike Price / Extracted Option
+# Type before caching, so the parsed columns replace the raw symbol; tickers stay categorical.
+EQUITY_COLUMNS = ['Date', 'Ticker', 'EQ_Close']
+OPTION_COLUMNS = ['Date', 'Ticker', 'Open', 'High', 'Close', 'Strike Price', 'Extracted Option Type']
+INDEX_COLUMNS = ['Date', 'Close']
+PRICE_COLUMNS = ('Open', 'High', 'Close')
+
+# Read one ticker's equity and options EOD files, with option tickers already parsed.
+# With use_cache the files come from the columnar cache in {data_dir}/.cache after the first run.
+def load_ticker_data(ticker, data_dir='Stocks_Data', use_cache=True):
+    if not use_cache:
+        equity_data = pd.read_csv(f'{data_dir}/{ticker}_EQ_EOD.csv')
+        options_data = parse_option_tickers(pd.read_csv(f'{data_dir}/{ticker}_Opt_EOD.csv'))
+        return equity_data, options_data
+    equity_data = load_cached(f'{data_dir}/{ticker}_EQ_EOD.csv')
+    options_data = load_cached(f'{data_dir}/{ticker}_Opt_EOD.csv', prepare=parse_option_tickers)
+    return equity_data, options_data
+
+# Only what one backtest run reads: the columns above, option prices as price_dtype, equity
+# rows from lookback_period bars before start_date (the volatility window) to end_date and
+# option rows from start_date to a week past end_date (the expiry calendar looks at the next
+# trading day). The window defaults to backtest_window(equity_data, months). stats times the
+# ticker parsing when the cache has to be built.
+# Returns (equity_data, options_data, start_date, end_date).
+def load_ticker_window(ticker, start_date=None, end_date=None, months=66, data_dir='Stocks_Data', lookback_period=252, price_dtype=np.float32,
+                       stats=NULL_STATS):
+    equity_path = f'{data_dir}/{ticker}_EQ_EOD.csv'
+    if start_date is None or end_date is None:
+        equity_data = load_cached(equity_path, columns=EQUITY_COLUMNS, categorical=('Ticker',))
+        start_date, end_date = backtest_window(equity_data, months)
+    equity_data = load_cached(equity_path, columns=EQUITY_COLUMNS, categorical=('Ticker',),
+                              date_range=(start_date, end_date), lookback=lookback_period + 1)
+    options_data = load_cached(f'{data_dir}/{ticker}_Opt_EOD.csv', prepare=stats.timed('ticker parse', parse_option_tickers), columns=OPTION_COLUMNS, categorical=('Ticker',),
+                               dtypes=dict.fromkeys(PRICE_COLUMNS, price_dtype), date_range=(start_date, options_end_date(end_date)))
+    return equity_data, options_data, start_date, end_date
+
+def options_end_date(end_date, days=7):
+    return (datetime.strptime(end_date, "%Y-%m-%d") + pd.Timedelta(days=days)).strftime("%Y-%m-%d")
+
+# Nifty monthly options pickle and Nifty index CSV used by the hedge leg. Only called once a
+# run actually has a hedge leg. With start_date / end_date only that window (plus the index's
+# volatility lookback) is read, and with pruned only the columns the hedge leg uses.
+def load_nifty_data(options_path='Nifty_MonthlyI_Opt2019.pkl', index_path='nifty_combined_sorted_data.csv', use_cache=True,
+                    start_date=None, end_date=None, pruned=True, lookback_period=252, price_dtype=np.float32):
+    if not use_cache:
+        return parse_option_tickers(pd.read_pickle(options_path)), pd.read_csv(index_path)
+    date_range = (start_date, end_date) if start_date is not None and end_date is not None else None
+    if not pruned:
+        nifty_options_data = load_cached(options_path, reader=pd.read_pickle, prepare=parse_option_tickers)
+        nifty_index_data = load_cached(index_path)
+    else:
+        nifty_options_data = load_cached(options_path, reader=pd.read_pickle, prepare=parse_option_tickers, columns=OPTION_COLUMNS, categorical=('Ticker',),
+                                         dtypes=dict.fromkeys(PRICE_COLUMNS, price_dtype),
+                                         date_range=date_range and (start_date, options_end_date(end_date)))
+        nifty_index_data = load_cached(index_path, columns=INDEX_COLUMNS, date_range=date_range, lookback=lookback_period + 1)
+    return nifty_options_data, nifty_index_data
+
+# Window of an incremental run: from the day after the state's last date to the last equity
+# date (start_date > end_date when no new bar has arrived)
+def update_window(ticker, last_date, data_dir='Stocks_Data'):
+    dates = load_cached(f'{data_dir}/{ticker}_EQ_EOD.csv', columns=['Date'])['Date']
+    start_date = (datetime.strptime(last_date, "%Y-%m-%d") + pd.Timedelta(days=1)).strftime("%Y-%m-%d")
+    return start_date, dates.iloc[-1]
+
+# Backtest from the first equity date over the following `months` months
+def backtest_window(equity_data, months=66):
+    start_date_eq = equity_data['Date'].iloc[0]
+    start_date = (datetime.strptime(start_date_eq, "%Y-%m-%d") + pd.DateOffset(months=0)).strftime("%Y-%m-%d")
+    end_date = (datetime.strptime(start_date, "%Y-%m-%d") + pd.DateOffset(months=months)).strftime("%Y-%m-%d")
+    return start_date, end_date
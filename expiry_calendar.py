@@ -0,0 +1,62 @@
+# expiry_calendar.py
+import numpy as np
+import pandas as pd
+
+from utilities import calculate_time_to_maturity_array, calculate_time_to_expiry_array
+
+
+class ExpiryCalendar:
+    # Monthly expiry calendar built once per run over an ascending timeline of trading days.
+    # Everything the backtest asks about expiry is an array lookup by position in `days`:
+    #   time_to_maturity  - years to this month's last Thursday (calculate_time_to_maturity)
+    #   days_to_expiry    - calendar days to the next last-Thursday expiry (calculate_time_to_expiry)
+    #   scheduled_expiry  - that last Thursday
+    #   expiry_dates      - actual expiry: the last date with an options chain on or before the
+    #                       scheduled one, so a Thursday holiday moves expiry to the day before
+    #   is_expiry_day     - the backtest's close-out rule: the scheduled expiry itself, or the day
+    #                       before it when no options traded on the scheduled day
+    def __init__(self, days, trading_days=None):
+        self.days = np.asarray(days, dtype='datetime64[D]')
+        self.time_to_maturity = calculate_time_to_maturity_array(self.days)
+        self.days_to_expiry = calculate_time_to_expiry_array(self.days)
+        self.scheduled_expiry = self.days + self.days_to_expiry
+
+        if trading_days is None:
+            trading_days = self.days
+        self.trading_days = np.unique(np.asarray(trading_days, dtype='datetime64[D]'))
+        self.expiry_dates = self.scheduled_expiry.copy()
+        if len(self.trading_days):
+            positions = np.searchsorted(self.trading_days, self.scheduled_expiry, 'right') - 1
+            shifted = positions >= 0
+            self.expiry_dates[shifted] = np.maximum(self.trading_days[positions[shifted]], self.days[shifted])
+        self.days_to_actual_expiry = (self.expiry_dates - self.days).astype(np.int64)
+
+        next_day_trades = np.isin(self.days + 1, self.trading_days)
+        self.is_expiry_day = (self.days_to_expiry == 0) | ((self.days_to_expiry == 1) & ~next_day_trades)
+
+    @classmethod
+    def from_option_chain(cls, days, option_chain):
+        # Trading days are the dates present in an OptionChainIndex
+        return cls(days, np.array(list(option_chain.slices), dtype='datetime64[D]'))
+
+    def position(self, date):
+        # Position of a date (string or datetime64) in the calendar, or -1 when it is not a calendar day
+        day = np.datetime64(date, 'D')
+        position = np.searchsorted(self.days, day)
+        return position if position < len(self.days) and self.days[position] == day else -1
+
+    def next_expiry(self, date):
+        # (actual next expiry, calendar days to it) for one date
+        position = self.position(date)
+        if position < 0:
+            raise KeyError(date)
+        return self.expiry_dates[position], self.days_to_actual_expiry[position]
+
+    def to_frame(self):
+        return pd.DataFrame({
+            'Date': np.datetime_as_string(self.days),
+            'Scheduled Expiry': np.datetime_as_string(self.scheduled_expiry),
+            'Expiry': np.datetime_as_string(self.expiry_dates),
+            'Days To Expiry': self.days_to_expiry,
+            'Is Expiry Day': self.is_expiry_day,
+        })
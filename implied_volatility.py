@@ -0,0 +1,116 @@
+# implied_volatility.py
+import numpy as np
+from scipy.special import ndtr
+
+from utilities import select_strike_by_delta
+
+# implied_volatility.py
+#
+# Batched Black-Scholes implied volatility for whole option chains, and a chain wrapper that
+# selects strikes on market-implied delta. The solver runs safeguarded Newton iterations on
+# NumPy arrays: every element keeps a [low, high] bracket that each iteration narrows, and a
+# Newton step that would leave the bracket (or has no vega to work with) is replaced by
+# bisection, so every solvable element converges. Elements are dropped from the working set
+# as they converge, and a multi-year chain is solved in a few dozen array passes instead of
+# one scipy root-find per contract.
+
+RISK_FREE_RATE = 0.07
+SQRT_2_PI = np.sqrt(2 * np.pi)
+
+
+def implied_volatility_vectorized(prices, S, K, T, r=RISK_FREE_RATE, option_type='call', low=1e-4, high=5.0,
+                                  tolerance=1e-6, max_iterations=100):
+    # Implied volatility of every element of broadcast (prices, S, K, T, option_type). NaN where
+    # there is none: prices outside the no-arbitrage bounds, non-positive inputs or T <= 0.
+    # tolerance is in volatility (price error over vega, or the bracket's width); results are
+    # clipped to [low, high].
+    prices, S, K, T, is_call = np.broadcast_arrays(np.asarray(prices, dtype=np.float64), np.asarray(S, dtype=np.float64),
+                                                   np.asarray(K, dtype=np.float64), np.asarray(T, dtype=np.float64),
+                                                   np.asarray(option_type) == 'call')
+    shape = prices.shape
+    prices, S, K, T, is_call = (values.ravel() for values in (prices, S, K, T, is_call))
+    with np.errstate(all='ignore'):
+        discount = K * np.exp(-r * T)
+        lower_bound = np.where(is_call, np.maximum(S - discount, 0.0), np.maximum(discount - S, 0.0))
+        upper_bound = np.where(is_call, S, discount)
+        solvable = (T > 0) & (S > 0) & (K > 0) & (prices > lower_bound) & (prices < upper_bound)
+
+        implied = np.full(prices.shape, np.nan)
+        rows = np.flatnonzero(solvable)
+        prices, S, K, T, is_call = prices[rows], S[rows], K[rows], T[rows], is_call[rows]
+        sqrt_T = np.sqrt(T)
+        lows = np.full(len(rows), low)
+        highs = np.full(len(rows), high)
+        # Brenner-Subrahmanyam at-the-money approximation as the starting point
+        sigma = np.clip(SQRT_2_PI / sqrt_T * prices / S, low, high)
+
+        active = np.arange(len(rows))
+        for _ in range(max_iterations):
+            if not len(active):
+                break
+            s, k, t, root_t, x = S[active], K[active], T[active], sqrt_T[active], sigma[active]
+            d1 = (np.log(s / k) + (r + 0.5 * x ** 2) * t) / (x * root_t)
+            d2 = d1 - x * root_t
+            discounted = k * np.exp(-r * t)
+            price = np.where(is_call[active], s * ndtr(d1) - discounted * ndtr(d2), discounted * ndtr(-d2) - s * ndtr(-d1))
+            difference = price - prices[active]
+            vega = s * np.exp(-0.5 * d1 ** 2) / SQRT_2_PI * root_t
+
+            # Price rises with volatility, so the sign of the error says which side the root is on
+            lows[active] = np.where(difference < 0, x, lows[active])
+            highs[active] = np.where(difference > 0, x, highs[active])
+            newton = x - difference / vega
+            inside = np.isfinite(newton) & (newton > lows[active]) & (newton < highs[active])
+            step = np.where(inside, newton, 0.5 * (lows[active] + highs[active]))
+
+            converged = (np.abs(difference) <= tolerance * vega) | (highs[active] - lows[active] <= tolerance)
+            sigma[active] = np.where(converged, x, step)
+            active = active[~converged]
+        implied[rows] = sigma
+    return implied.reshape(shape)
+
+def chain_implied_volatility(option_chain, dates, spot_prices, times_to_maturity, price_column='Close', r=RISK_FREE_RATE):
+    # Implied volatility of every row of an OptionChainIndex on the given dates (NaN on other
+    # dates), from price_column, in one solve. spot_prices / times_to_maturity are per date.
+    implied = np.full(len(option_chain.strikes), np.nan)
+    spans = [(option_chain.slices[date], spot_price, time_to_maturity)
+             for date, spot_price, time_to_maturity in zip(dates, spot_prices, times_to_maturity) if date in option_chain.slices]
+    if not spans:
+        return implied
+    rows = np.concatenate([np.arange(start, stop) for (start, stop), _, _ in spans])
+    lengths = [stop - start for (start, stop), _, _ in spans]
+    S = np.repeat([spot_price for _, spot_price, _ in spans], lengths)
+    T = np.repeat([time_to_maturity for _, _, time_to_maturity in spans], lengths)
+    option_types = np.where(option_chain.type_codes[rows] == 0, 'call', 'put')
+    implied[rows] = implied_volatility_vectorized(option_chain.prices[price_column][rows], S, option_chain.strikes[rows], T, r, option_types)
+    return implied
+
+
+class ImpliedDeltaChain:
+    # OptionChainIndex whose find_by_delta selects on market-implied delta: each strike's delta
+    # is priced with its own implied volatility. The volatility passed in (the historical one)
+    # only stands in for strikes without an implied volatility. Everything else is the chain's.
+    def __init__(self, option_chain, implied_volatilities):
+        self.option_chain = option_chain
+        self.implied_volatilities = implied_volatilities
+        self.selections = {}
+
+    @classmethod
+    def from_days(cls, option_chain, dates, spot_prices, times_to_maturity, price_column='Close'):
+        return cls(option_chain, chain_implied_volatility(option_chain, dates, spot_prices, times_to_maturity, price_column))
+
+    def __contains__(self, date):
+        return date in self.option_chain
+
+    def __getattr__(self, name):
+        return getattr(self.option_chain, name)
+
+    def find_by_delta(self, date, spot_price, time_to_maturity, volatility, target_delta, option_type='call'):
+        key = (date, spot_price, time_to_maturity, volatility, target_delta, option_type)
+        if key not in self.selections:
+            low, high = self.option_chain.type_range(date, option_type)
+            implied = self.implied_volatilities[low:high]
+            volatilities = np.where(np.isnan(implied), volatility, implied)
+            self.selections[key] = low + select_strike_by_delta(self.option_chain.strikes[low:high], spot_price, time_to_maturity,
+                                                                volatilities, target_delta, option_type)
+        return self.option_chain.row(self.selections[key])
@@ -0,0 +1,173 @@
+# instrumentation.py
+import time
+from collections import Counter, defaultdict
+import numpy as np
+import pandas as pd
+
+# instrumentation.py
+#
+# Optional instrumentation for the loop backtests and their runners. A BacktestStats passed as
+# `stats` collects per-phase wall times and counters for one ticker; without one the backtests
+# use NULL_STATS, whose methods do nothing. Phases:
+#   load               - load_ticker_window, ticker parsing included
+#   ticker parse       - parse_option_tickers (only when the cache is built; cached runs skip it)
+#   data slice         - per-date row maps, option chain index and volatility series
+#   expiry check       - the expiry calendar
+#   implied volatility - the chains' implied volatility solve (volatility_source="implied")
+#   delta search       - find_by_delta calls (also "nifty delta search" for the hedge leg)
+#   price lookup       - quote calls (also "nifty price lookup")
+#   intraday bars      - minute bars of held contracts read for the SL check (intraday_data.py)
+#   loop               - the whole day loop, delta searches and price lookups included
+# The chain calls are timed through a TimedChain wrapper, so the loop itself only pays a few
+# perf_counter calls per day. Counters: days in the window, days skipped (no data for the
+# date, or an exception swallowed by the loop), exceptions by type, trades, SL hits and
+# re-entries, the last three read off the finished tradebook.
+
+class BacktestStats:
+    def __init__(self, ticker=None):
+        self.ticker = ticker
+        self.seconds = defaultdict(float)
+        self.calls = defaultdict(int)
+        self.counters = Counter()
+        self.exceptions = Counter()
+        self.error = None
+        self.mark = time.perf_counter()
+
+    def start(self):
+        self.mark = time.perf_counter()
+
+    def lap(self, phase):
+        # Charge the time since the last start() / lap() to phase
+        now = time.perf_counter()
+        self.add(phase, now - self.mark)
+        self.mark = now
+
+    def add(self, phase, seconds):
+        self.seconds[phase] += seconds
+        self.calls[phase] += 1
+
+    def timed(self, phase, function):
+        def timed_function(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                self.add(phase, time.perf_counter() - started)
+        return timed_function
+
+    def wrap(self, option_chain, leg=''):
+        return TimedChain(option_chain, self, leg)
+
+    def swallowed(self, error):
+        # An exception the backtest caught and skipped past (the rest of that day)
+        self.exceptions[type(error).__name__] += 1
+
+    def failed(self, error):
+        # The whole run raised (the runner returned an empty tradebook for the ticker)
+        self.error = f'{type(error).__name__}: {error}'
+
+    def count_days(self, dates, timeline, start_day, end_day, *required):
+        # Days in the backtest window and those without a row in one of the `required` date
+        # maps / chains, which the loop skips before doing anything
+        in_window = (timeline >= start_day) & (timeline <= end_day)
+        self.counters['days'] += int(in_window.sum())
+        self.counters['days without data'] += sum(1 for date in np.asarray(dates)[in_window]
+                                                  if any(date not in rows for rows in required))
+
+    def count_trades(self, trades):
+        records = trades.records if hasattr(trades, 'records') else trades
+        if len(records) == 0:
+            return
+        self.counters['trades'] += len(records)
+        self.counters['overnight SL hits'] += int((records['Option SL'] == 'Overnight SL Hit').sum())
+        self.counters['intraday SL hits'] += int((records['Option SL'] == 'Intraday SL Hit').sum())
+        self.counters['re-entries'] += int(records['Re-entry'].sum())
+
+    def summary(self):
+        # One flat row per ticker, for a DataFrame over all workers' summaries
+        skipped = self.counters['days without data'] + sum(self.exceptions.values())
+        row = {'ticker': self.ticker, 'days': self.counters['days'], 'days processed': self.counters['days'] - skipped,
+               'days skipped': skipped, 'exceptions': sum(self.exceptions.values()), 'error': self.error}
+        row.update((name, count) for name, count in self.counters.items() if name != 'days')
+        row.update((f'{name} exceptions', count) for name, count in self.exceptions.items())
+        row.update((f'{phase} seconds', seconds) for phase, seconds in self.seconds.items())
+        row.update((f'{phase} calls', self.calls[phase]) for phase in self.seconds if phase.endswith(('search', 'lookup', 'bars')))
+        return row
+
+
+class NullStats:
+    # Stand-in when instrumentation is off
+    def start(self):
+        pass
+
+    def lap(self, phase):
+        pass
+
+    def timed(self, phase, function):
+        return function
+
+    def wrap(self, option_chain, leg=''):
+        return option_chain
+
+    def swallowed(self, error):
+        pass
+
+    def failed(self, error):
+        pass
+
+    def count_days(self, dates, timeline, start_day, end_day, *required):
+        pass
+
+    def count_trades(self, trades):
+        pass
+
+NULL_STATS = NullStats()
+
+
+class TimedChain:
+    # OptionChainIndex whose find_by_delta and quote calls are charged to a BacktestStats
+    def __init__(self, option_chain, stats, leg=''):
+        self.option_chain = option_chain
+        self.stats = stats
+        prefix = f'{leg} ' if leg else ''
+        self.search_phase = prefix + 'delta search'
+        self.lookup_phase = prefix + 'price lookup'
+
+    def __contains__(self, date):
+        return date in self.option_chain
+
+    def __getattr__(self, name):
+        return getattr(self.option_chain, name)
+
+    def find_by_delta(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.option_chain.find_by_delta(*args, **kwargs)
+        finally:
+            self.stats.add(self.search_phase, time.perf_counter() - started)
+
+    def quote(self, *args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return self.option_chain.quote(*args, **kwargs)
+        finally:
+            self.stats.add(self.lookup_phase, time.perf_counter() - started)
+
+
+# Per-ticker summaries from all workers -> one table, counters missing for a ticker as 0
+def stats_frame(summaries):
+    stats_df = pd.DataFrame([summary for summary in summaries if summary is not None])
+    if stats_df.empty:
+        return stats_df
+    columns = [column for column in stats_df.columns if column not in ('ticker', 'error')]
+    stats_df[columns] = stats_df[columns].fillna(0)
+    return stats_df
+
+# Phases that do not overlap; the others are parts of one of these
+TOP_LEVEL_PHASES = ('load', 'data slice', 'expiry check', 'implied volatility', 'loop')
+
+# Where the time went, over all tickers: seconds per phase and share of the instrumented total
+def phase_totals(stats_df):
+    phases = [column for column in stats_df.columns if column.endswith(' seconds')]
+    totals = stats_df[phases].sum().rename(lambda column: column[:-len(' seconds')])
+    return pd.DataFrame({'Seconds': totals, 'Share': totals / totals.reindex(TOP_LEVEL_PHASES).sum()})
@@ -0,0 +1,161 @@
+# intraday_data.py
+import os
+import numpy as np
+import pandas as pd
+
+from utilities import parse_option_tickers
+
+# intraday_data.py
+#
+# Streaming access to intraday (minute bar) options files for the SL check. A file holds one
+# underlying's bars sorted by Date and Time ({data_dir}/{ticker}_Opt_1min.csv: Date, Time,
+# Ticker, Open, High, Close) and is far too large to read whole, so IntradayReader reads it
+# in chunks of `chunksize` rows and hands out one complete trading day at a time: rows of the
+# day still being read are carried over to the next chunk, days before the one asked for are
+# dropped, and only the current day is kept. Memory stays at one chunk plus one day however
+# long the history is. The backtest only moves forward in time, so a reader serves one run;
+# contract_bars() then gives the held contract's bars of the day to intraday_sl_exit. A run
+# starting later than the file (a backtest window, a daily update) passes its start_date: the
+# file is sorted, so the first row of that date is found by bisecting the file's byte offsets
+# and parsing starts there instead of at the top of a multi-year file.
+
+INTRADAY_COLUMNS = ['Date', 'Time', 'Ticker', 'Open', 'High', 'Close']
+
+
+def intraday_path(ticker, data_dir='Stocks_Data'):
+    return f'{data_dir}/{ticker}_Opt_1min.csv'
+
+# Readers for the underlyings of one run that have an intraday file: the stock's, and the
+# Nifty's when nifty_path is given
+def intraday_readers(ticker, nifty_path=None, data_dir='Stocks_Data', chunksize=200000, start_date=None):
+    paths = {'stock': intraday_path(ticker, data_dir), 'nifty': nifty_path}
+    return {underlying: IntradayReader(path, chunksize, start_date=start_date) for underlying, path in paths.items() if path is not None and os.path.exists(path)}
+
+def close_readers(readers):
+    for reader in (readers or {}).values():
+        reader.close()
+
+# Byte offset of the first row dated start_date or later in an open (binary) file sorted by
+# date. The search is over byte offsets, each probe reading the first whole line after it.
+def date_offset(f, start_date):
+    f.seek(0)
+    header = f.readline()
+    date_field = header.decode().rstrip('\r\n').split(',').index('Date')
+    start = start_date.encode()
+    low, high = len(header), f.seek(0, os.SEEK_END)
+    while low < high:
+        middle = (low + high) // 2
+        f.seek(middle - 1)
+        f.readline()
+        line = f.readline()
+        if not line.strip() or line.split(b',')[date_field] >= start:
+            high = middle
+        else:
+            low = middle + 1
+    f.seek(low - 1)
+    f.readline()
+    return f.tell()
+
+# (date, bars) for each trading day of the file from start_date on, in file order, with
+# option tickers parsed
+def iter_days(path, chunksize=200000, price_dtype=np.float32, start_date=None):
+    carry = None
+    last_date = None
+    with open(path, 'rb') as f:
+        names = f.readline().decode().rstrip('\r\n').split(',')
+        if start_date is not None:
+            f.seek(date_offset(f, start_date))
+        if f.tell() == os.fstat(f.fileno()).st_size:
+            return
+        with pd.read_csv(f, header=None, names=names, chunksize=chunksize, usecols=INTRADAY_COLUMNS, dtype={'Date': str, 'Time': str, 'Ticker': str}) as chunks:
+            for chunk in chunks:
+                chunk = parse_option_tickers(chunk.astype({'Open': price_dtype, 'High': price_dtype, 'Close': price_dtype}))
+                if carry is not None:
+                    chunk = pd.concat([carry, chunk], ignore_index=True)
+                dates = chunk['Date'].to_numpy()
+                if (dates[1:] < dates[:-1]).any() or (last_date is not None and dates[0] < last_date):
+                    raise ValueError(f"Intraday file is not sorted by date: {path}")
+                # The chunk's last date may continue in the next chunk
+                split = np.searchsorted(dates, dates[-1], 'left')
+                starts = np.flatnonzero(np.r_[True, dates[1:split] != dates[:split - 1]]) if split else np.array([], dtype=int)
+                for start, stop in zip(starts, np.r_[starts[1:], split]):
+                    yield dates[start], chunk.iloc[start:stop].reset_index(drop=True)
+                carry = chunk.iloc[split:]
+                last_date = dates[-1]
+    if carry is not None and len(carry):
+        yield last_date, carry.reset_index(drop=True)
+
+
+class IntradayReader:
+    # Forward-only, one-day-at-a-time view of an intraday file. bars(date) must be called with
+    # non-decreasing dates; a date without bars gives an empty frame.
+    def __init__(self, path, chunksize=200000, price_dtype=np.float32, start_date=None):
+        self.path = path
+        self.days = iter_days(path, chunksize, price_dtype, start_date)
+        self.date = None
+        self.day = None
+        self.next_day = None
+        self.contracts = {}
+
+    def bars(self, date):
+        if self.date != date:
+            if self.date is not None and date < self.date:
+                raise ValueError(f"Intraday bars requested out of order: {date} after {self.date}")
+            self.date = date
+            self.day = None
+            self.contracts = {}
+            while True:
+                if self.next_day is None:
+                    self.next_day = next(self.days, None)
+                if self.next_day is None or self.next_day[0] > date:
+                    break
+                day_date, day = self.next_day
+                self.next_day = None
+                if day_date == date:
+                    self.day = day
+                    break
+        if self.day is None:
+            return pd.DataFrame(columns=INTRADAY_COLUMNS + ['Strike Price', 'Extracted Option Type'])
+        return self.day
+
+    def contract_bars(self, date, strike_price, option_type='call'):
+        # {'Time', 'Open', 'High', 'Close'} arrays of one contract's bars on date, in time order
+        key = (strike_price, option_type)
+        if self.date != date or key not in self.contracts:
+            day = self.bars(date)
+            rows = np.zeros(len(day), dtype=bool)
+            if len(day):
+                rows = (day['Strike Price'].to_numpy() == strike_price) & (day['Extracted Option Type'] == option_type).to_numpy()
+            self.contracts[key] = {column: day[column].to_numpy()[rows] for column in ('Time', 'Open', 'High', 'Close')}
+        return self.contracts[key]
+
+    def close(self):
+        # Closes the file and the CSV reader the day iterator holds open
+        self.days.close()
+
+
+# First bar of the day's contract bars at which a short option's stop at `threshold` is hit:
+# (exit price, SL label, bar time), or None. The first bar opening at or above the stop is an
+# overnight hit filled at that open; later, the first bar whose High reaches it is filled at
+# the stop, or at the bar's open when the price gapped through it between bars.
+def intraday_sl_exit(bars, threshold):
+    opens, highs = bars['Open'], bars['High']
+    if not len(opens):
+        return None
+    if opens[0] >= threshold:
+        return np.float64(opens[0]), 'Overnight SL Hit', bars['Time'][0]
+    hits = np.flatnonzero(highs >= threshold)
+    if not len(hits):
+        return None
+    bar = hits[0]
+    return max(np.float64(opens[bar]), threshold), 'Intraday SL Hit', bars['Time'][bar]
+
+# A hedge's price at `time` from its own bars: the Open of the first bar (an overnight exit),
+# otherwise the Close of its last bar at or before `time`; None without bars
+def price_at_time(bars, time, overnight=False):
+    if not len(bars['Time']):
+        return None
+    if overnight:
+        return np.float64(bars['Open'][0])
+    bar = max(np.searchsorted(bars['Time'], time, 'right') - 1, 0)
+    return np.float64(bars['Close'][bar])
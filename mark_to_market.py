@@ -0,0 +1,155 @@
+# mark_to_market.py
+import numpy as np
+import pandas as pd
+
+from option_chain import OptionChainIndex, build_date_index
+
+# mark_to_market.py
+#
+# Daily mark-to-market of the backtests' tradebooks. Every leg of every trade (the stock
+# option and, when hedged, the Nifty option) is valued at each trading day's Close while it is
+# open, its last quote carried over days the contract did not trade, and at its tradebook PnL
+# from its close date on. ticker_marks does this for one ticker's records, in the worker that
+# already holds its chains, and returns one small per-date frame (cumulative PnL per leg and
+# notional exposure). PortfolioCurve collects those frames from all tickers into a dense
+# date x ticker matrix, giving the portfolio equity curve, its true daily drawdown, exposure
+# and margin use and rolling risk statistics. A leg's value on a day before its close is
+# (initial price - mark) * lot size, the backtest's own PnL convention, so the final cumulative
+# PnL is the tradebook total.
+
+# Record columns of each leg: strike, initial price, PnL, lot size
+LEGS = {
+    'stock': ('Option Strike', 'Option Initial Price', 'Options PNL', 'lot_size'),
+    'nifty': ('Nifty Option Strike', 'Nifty Option Initial Price', 'Nifty Options PNL', 'Nifty lot_size'),
+}
+
+
+def leg_marks(dates, spot_prices, records, option_chain, option_type, leg='stock'):
+    # (cumulative PnL, exposure) of one leg of records on each of the sorted dates
+    strike_column, price_column, pnl_column, lot_column = LEGS[leg]
+    days = len(dates)
+    opens = np.searchsorted(dates, records['Option Open Date'])
+    closes = np.searchsorted(dates, records['Option Close Date'])
+    initial_prices = records[price_column].astype(np.float64)
+    lot_sizes = records[lot_column].astype(np.float64)
+
+    # One (trade, day) pair per day a leg is held before its close day
+    lengths = np.maximum(closes - opens, 0)
+    trades = np.repeat(np.arange(len(records)), lengths)
+    firsts = np.repeat(np.cumsum(lengths) - lengths, lengths)
+    held_days = opens[trades] + np.arange(len(trades)) - firsts
+
+    marks = option_chain.prices_at(dates[held_days], records[strike_column][trades], option_type)
+    # Carry the last quote forward; a leg without a quote on its open day is marked at its entry price
+    first_pairs = np.cumsum(lengths)[lengths > 0] - lengths[lengths > 0]
+    marks[first_pairs] = np.where(np.isnan(marks[first_pairs]), initial_prices[trades[first_pairs]], marks[first_pairs])
+    quoted = np.where(np.isnan(marks), 0, np.arange(len(marks)))
+    marks = marks[np.maximum.accumulate(quoted)] if len(marks) else marks
+
+    unrealized = np.bincount(held_days, weights=(initial_prices[trades] - marks) * lot_sizes[trades], minlength=days)
+    realized = np.cumsum(np.bincount(closes, weights=records[pnl_column].astype(np.float64), minlength=days + 1))[:days]
+    exposure = np.bincount(held_days, weights=lot_sizes[trades] * spot_prices[held_days], minlength=days)
+    return realized + unrealized, exposure
+
+def ticker_marks(records, equity_data, option_chain, stock_ticker, start_date, end_date, option_type='call',
+                 nifty_option_chain=None, nifty_index_data=None):
+    # Per-date frame (Date, Options PNL, Exposure[, Nifty Options PNL, Nifty Exposure]) over the
+    # ticker's trading days from start_date to end_date; Nifty columns when the chain is given
+    stock_data, stock_rows = build_date_index(equity_data, stock_ticker)
+    dates = np.array(sorted(date for date in stock_rows if start_date <= date <= end_date))
+    option_chain = option_chain if isinstance(option_chain, OptionChainIndex) else OptionChainIndex(option_chain)
+    spot_prices = stock_data['EQ_Close'].to_numpy(dtype=np.float64)[[stock_rows[date] for date in dates]]
+    marks = {'Date': dates}
+    marks['Options PNL'], marks['Exposure'] = leg_marks(dates, spot_prices, records, option_chain, option_type, 'stock')
+    if nifty_option_chain is not None:
+        index_data, index_rows = build_date_index(nifty_index_data)
+        index_closes = index_data['Close'].to_numpy(dtype=np.float64)
+        # Days without a Nifty close carry the last one (the engine skips those days anyway)
+        nifty_spot_prices = pd.Series([index_closes[index_rows[date]] if date in index_rows else np.nan for date in dates]).ffill().fillna(0).to_numpy()
+        nifty_option_chain = nifty_option_chain if isinstance(nifty_option_chain, OptionChainIndex) else OptionChainIndex(nifty_option_chain)
+        marks['Nifty Options PNL'], marks['Nifty Exposure'] = leg_marks(dates, nifty_spot_prices, records, nifty_option_chain, option_type, 'nifty')
+    return pd.DataFrame(marks)
+
+# Worst peak-to-trough fall of a daily cumulative PnL series (the peak includes the 0 start)
+def max_drawdown(cumulative_pnl):
+    cumulative_pnl = np.r_[0.0, cumulative_pnl]
+    return (cumulative_pnl - np.maximum.accumulate(cumulative_pnl)).min()
+
+
+class PortfolioCurve:
+    # Collects ticker_marks frames and combines them on the union of their dates. Cumulative PnL
+    # carries forward over a ticker's missing dates; exposure is 0 there. signs flips a PnL
+    # column (buy mode), as in TradebookAggregator; margin_rate is the margin blocked per rupee
+    # of stock-leg exposure.
+    def __init__(self, pnl_columns=('Options PNL',), signs=None, margin_rate=None):
+        self.pnl_columns = list(pnl_columns)
+        self.signs = signs or {}
+        self.margin_rate = margin_rate
+        self.marks = {}
+
+    def add(self, ticker, marks):
+        if marks is not None and len(marks):
+            self.marks[ticker] = marks
+        return ticker
+
+    def dates(self):
+        if not self.marks:
+            return np.array([], dtype=str)
+        return np.unique(np.concatenate([marks['Date'].to_numpy() for marks in self.marks.values()]))
+
+    def matrix(self, column=None, fill='carry'):
+        # Dense date x ticker array of one column (default: the signed sum of pnl_columns)
+        dates = self.dates()
+        values = np.full((len(dates), len(self.marks)), np.nan)
+        for j, marks in enumerate(self.marks.values()):
+            if column is None:
+                series = sum(marks[name].to_numpy() * self.signs.get(name, 1) for name in self.pnl_columns)
+            else:
+                series = marks[column].to_numpy()
+            values[np.searchsorted(dates, marks['Date'].to_numpy()), j] = series
+        if fill == 'carry':
+            rows = np.where(np.isnan(values), 0, np.arange(len(dates))[:, None])
+            values = np.take_along_axis(values, np.maximum.accumulate(rows, axis=0), axis=0)
+        return np.nan_to_num(values)
+
+    def pnl_matrix(self):
+        # Daily PnL per ticker as a DataFrame (dates x tickers)
+        cumulative = self.matrix()
+        return pd.DataFrame(np.diff(cumulative, axis=0, prepend=0), index=pd.Index(self.dates(), name='Date'), columns=list(self.marks))
+
+    def equity_curve(self, capital=0):
+        dates = self.dates()
+        cumulative_pnl = self.matrix().sum(axis=1)
+        equity_curve_df = pd.DataFrame({
+            'Date': dates,
+            'PNL': np.diff(cumulative_pnl, prepend=0),
+            'Cumulative PNL': cumulative_pnl,
+            'Equity': capital + cumulative_pnl,
+            'Drawdown': cumulative_pnl - np.maximum.accumulate(np.r_[0.0, cumulative_pnl])[1:],
+            'Exposure': self.matrix('Exposure', fill=None).sum(axis=1),
+            'Open Tickers': (self.matrix('Exposure', fill=None) > 0).sum(axis=1),
+        })
+        if any('Nifty Exposure' in marks for marks in self.marks.values()):
+            equity_curve_df['Nifty Exposure'] = self.matrix('Nifty Exposure', fill=None).sum(axis=1)
+        if self.margin_rate is not None:
+            equity_curve_df['Margin'] = equity_curve_df['Exposure'] * self.margin_rate
+        return equity_curve_df
+
+    def max_drawdown(self):
+        return max_drawdown(self.matrix().sum(axis=1))
+
+    def rolling_stats(self, window=21, periods_per_year=252):
+        # Rolling risk of the portfolio's daily PnL over `window` trading days
+        equity_curve_df = self.equity_curve()
+        daily_pnl = equity_curve_df['PNL']
+        rolling = daily_pnl.rolling(window)
+        rolling_stats_df = pd.DataFrame({
+            'Date': equity_curve_df['Date'],
+            'Mean PNL': rolling.mean(),
+            'Volatility': rolling.std() * np.sqrt(periods_per_year),
+            'Sharpe': rolling.mean() / rolling.std() * np.sqrt(periods_per_year),
+            'Worst Day': rolling.min(),
+            'Max Drawdown': equity_curve_df['Cumulative PNL'].rolling(window).apply(lambda values: (values - np.maximum.accumulate(values)).min(), raw=True),
+            'Peak Exposure': equity_curve_df['Exposure'].rolling(window).max(),
+        })
+        return rolling_stats_df
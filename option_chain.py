@@ -0,0 +1,162 @@
+# option_chain.py
+import numpy as np
+import pandas as pd
+
+from utilities import parse_option_tickers, select_strike_by_delta
+from selection_cache import strikes_fingerprint
+
+OPTION_TYPE_CODES = {'call': 0, 'put': 1}
+PRICE_COLUMNS = ['Open', 'High', 'Low', 'Close']
+
+
+class OptionChainIndex:
+    # Copy of an options frame sorted by (Date, option type, strike) with a date -> (start, stop)
+    # row slice map, so the daily loop can pull one day's chain, or one contract's prices,
+    # without scanning the whole frame. selection_cache (a selection_cache.SelectionCache) backs
+    # the in-memory delta selections with a persistent, bounded store.
+    def __init__(self, options_data, selection_cache=None):
+        if 'Strike Price' not in options_data.columns:
+            parse_option_tickers(options_data)
+        sort_keys = pd.DataFrame({
+            'Date': options_data['Date'].to_numpy(),
+            'Type': np.asarray(options_data['Extracted Option Type'].cat.codes, dtype=np.int8),
+            'Strike': options_data['Strike Price'].to_numpy(),
+        })
+        order = sort_keys.sort_values(['Date', 'Type', 'Strike'], kind='mergesort').index.to_numpy()
+        self.data = options_data.take(order).reset_index(drop=True)
+
+        self.strikes = self.data['Strike Price'].to_numpy()
+        self.type_codes = sort_keys['Type'].to_numpy()[order]
+        self.prices = {column: self.data[column].to_numpy() for column in PRICE_COLUMNS if column in self.data.columns}
+        # Delta selections already made on this chain; runs sharing the index (sweeps) reuse them
+        self.selections = {}
+        self.selection_cache = selection_cache
+        # Parameter-independent arrays engines derive from this chain per window (the vectorized
+        # engine's price paths), likewise shared by the runs on it
+        self.prepared = {}
+
+        dates = self.data['Date'].to_numpy()
+        if len(dates) == 0:
+            self.slices = {}
+            return
+        starts = np.flatnonzero(np.r_[True, dates[1:] != dates[:-1]])
+        stops = np.r_[starts[1:], len(dates)]
+        self.slices = dict(zip(dates[starts], zip(starts, stops)))
+
+    @classmethod
+    def from_arrays(cls, slices, strikes, type_codes, prices, selection_cache=None):
+        # Rebuild an index around already sorted arrays (e.g. views on shared memory) without copying them
+        chain = cls.__new__(cls)
+        chain.data = None
+        chain.slices = slices
+        chain.strikes = strikes
+        chain.type_codes = type_codes
+        chain.prices = prices
+        chain.selections = {}
+        chain.selection_cache = selection_cache
+        chain.prepared = {}
+        return chain
+
+    def arrays(self):
+        return {'strikes': self.strikes, 'type_codes': self.type_codes, **self.prices}
+
+    def to_frame(self):
+        dates = np.empty(len(self.strikes), dtype=object)
+        for date, (start, stop) in self.slices.items():
+            dates[start:stop] = date
+        return pd.DataFrame({
+            'Date': dates,
+            **self.prices,
+            'Strike Price': self.strikes,
+            'Extracted Option Type': pd.Categorical.from_codes(self.type_codes, categories=list(OPTION_TYPE_CODES)),
+        })
+
+    def __contains__(self, date):
+        return date in self.slices
+
+    def __len__(self):
+        return len(self.slices)
+
+    def get(self, date):
+        # Empty frame (same columns) when there is no chain for the date
+        if self.data is None:
+            self.data = self.to_frame()
+        if date not in self.slices:
+            return self.data.iloc[0:0]
+        start, stop = self.slices[date]
+        return self.data.iloc[start:stop]
+
+    def type_range(self, date, option_type='call'):
+        # Row range of one option type on one date; strikes inside it are ascending
+        start, stop = self.slices[date]
+        types = self.type_codes[start:stop]
+        code = OPTION_TYPE_CODES[option_type]
+        return start + np.searchsorted(types, code, 'left'), start + np.searchsorted(types, code, 'right')
+
+    def row(self, position):
+        # Prices may be stored narrow (float32); the backtest does its arithmetic in float64
+        option_row = {column: np.float64(values[position]) for column, values in self.prices.items()}
+        option_row['Strike Price'] = self.strikes[position]
+        return option_row
+
+    def quote(self, date, strike_price, option_type='call'):
+        # All OHLC fields of one contract in one lookup. Fields are None when the
+        # contract did not trade that day, matching get_option_price.
+        if date in self.slices:
+            low, high = self.type_range(date, option_type)
+            position = low + np.searchsorted(self.strikes[low:high], strike_price, 'left')
+            if position < high and self.strikes[position] == strike_price:
+                return self.row(position)
+        return dict.fromkeys(list(self.prices) + ['Strike Price'])
+
+    def prices_at(self, dates, strikes, option_type='call', column='Close'):
+        # quote(date, strike, option_type)[column] for arrays of dates and strikes at once,
+        # one binary search per distinct date; NaN where the contract did not trade
+        dates = np.asarray(dates)
+        strikes = np.asarray(strikes)
+        values = np.full(len(dates), np.nan)
+        order = np.argsort(dates, kind='stable')
+        unique_dates, starts = np.unique(dates[order], return_index=True)
+        for date, group in zip(unique_dates, np.split(order, starts[1:])):
+            if date not in self.slices:
+                continue
+            low, high = self.type_range(date, option_type)
+            positions = low + np.searchsorted(self.strikes[low:high], strikes[group], 'left')
+            found = positions < high
+            found[found] = self.strikes[positions[found]] == strikes[group][found]
+            values[group[found]] = self.prices[column][positions[found]]
+        return values
+
+    def find_by_delta(self, date, spot_price, time_to_maturity, volatility, target_delta, option_type='call'):
+        # Array version of find_option_by_delta over the indexed chain, memoized per set of inputs
+        key = (date, spot_price, time_to_maturity, volatility, target_delta, option_type)
+        if key not in self.selections:
+            low, high = self.type_range(date, option_type)
+            strikes = self.strikes[low:high]
+            strike = None
+            if self.selection_cache is not None:
+                fingerprint = strikes_fingerprint(strikes)
+                strike = self.selection_cache.get(key, fingerprint)
+            if strike is not None:
+                position = np.searchsorted(strikes, strike)
+            else:
+                position = select_strike_by_delta(strikes, spot_price, time_to_maturity, volatility, target_delta, option_type)
+                if self.selection_cache is not None:
+                    self.selection_cache.put(key, fingerprint, strikes[position])
+            self.selections[key] = low + position
+        return self.row(self.selections[key])
+
+    def save_selections(self):
+        if self.selection_cache is not None:
+            self.selection_cache.save()
+
+
+def build_date_index(data, ticker=None):
+    # Map each date to its row position, optionally restricted to one ticker's rows
+    if ticker is not None:
+        data = data[data['Ticker'] == ticker]
+    data = data.reset_index(drop=True)
+    rows = {}
+    for position, date in enumerate(data['Date'].to_numpy()):
+        rows.setdefault(date, position)
+    return data, rows
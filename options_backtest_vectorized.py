@@ -0,0 +1,213 @@
+# options_backtest_vectorized.py
+import numpy as np
+
+from option_chain import OptionChainIndex, OPTION_TYPE_CODES
+from options_kernel import BacktestDays
+from tradebook import TradeBook, TRADE_FIELDS, STATUS_FIELDS
+
+# options_backtest_vectorized.py
+#
+# Alternative engine for the sell-option-with-SL strategy in options_backtest.py. Instead of
+# stepping through every day, it looks the held contract's Open/High/Close path up as arrays
+# and finds the next event (overnight SL, intraday SL, cost re-entry, expiry) with one
+# vectorized comparison + argmax, so the Python-level work is per event rather than per day.
+# Everything that does not depend on the strategy parameters - the per-day spot, volatility
+# and expiry arrays and every contract's price path over the window - is built once per
+# chain, window and option type (CyclePaths) and kept on the OptionChainIndex, so the runs of
+# a sweep only pay for their events. It reproduces the loop engine's tradebook, including how
+# the loop treats a day on which the held contract has no quote (the day is skipped outright).
+# Equity dates are expected in ascending order, as the loop engine also assumes.
+
+
+class CyclePaths:
+    # BacktestDays for one window plus, for every strike of the option type, the positions of
+    # the days it traded on (ascending) with its Open/High/Close and expiry flag on those days.
+    # Built with one sort of the window's chain rows; the first row of a (day, strike) counts,
+    # as in OptionChainIndex.quote.
+    def __init__(self, stock_ticker, equity_data, option_chain, start_date, end_date, option_type):
+        days = BacktestDays(stock_ticker, equity_data, option_chain, start_date, end_date, option_type)
+        self.days = days
+        self.dates = days.dates
+        self.expiry_positions = np.flatnonzero(days.is_expiry_day)
+
+        slices = np.array([option_chain.slices[date] for date in days.dates], dtype=np.int64).reshape(-1, 2)
+        lengths = slices[:, 1] - slices[:, 0]
+        day_of_row = np.repeat(np.arange(len(days)), lengths)
+        rows = np.arange(lengths.sum()) - np.repeat(np.cumsum(lengths) - lengths, lengths) + np.repeat(slices[:, 0], lengths)
+        keep = option_chain.type_codes[rows] == OPTION_TYPE_CODES[option_type]
+        rows, day_of_row = rows[keep], day_of_row[keep]
+        strikes = option_chain.strikes[rows]
+        order = np.lexsort((day_of_row, strikes))
+        rows, day_of_row, strikes = rows[order], day_of_row[order], strikes[order]
+        first = np.r_[True, (strikes[1:] != strikes[:-1]) | (day_of_row[1:] != day_of_row[:-1])]
+        rows, day_of_row, strikes = rows[first], day_of_row[first], strikes[first]
+
+        prices = {column: option_chain.prices[column][rows].astype(np.float64) for column in ('Open', 'High', 'Close')}
+        expiry = days.is_expiry_day[day_of_row]
+        bounds = np.flatnonzero(np.r_[True, strikes[1:] != strikes[:-1], True])
+        self.contracts = {strike: (day_of_row[start:stop], prices['Open'][start:stop], prices['High'][start:stop],
+                                   prices['Close'][start:stop], expiry[start:stop])
+                          for strike, start, stop in zip(strikes[bounds[:-1]].tolist(), bounds[:-1], bounds[1:])}
+
+    def __len__(self):
+        return len(self.dates)
+
+    def next_sl(self, k, strike_price, threshold):
+        # (day, Open, High, Close) of the first day >= k on which the contract trades and opens
+        # or trades at or above threshold, or an expiry day it trades on; None when there is none
+        days, opens, highs, closes, expiry = self.contracts[strike_price]
+        start = days.searchsorted(k)
+        hits = (opens[start:] >= threshold) | (highs[start:] >= threshold) | expiry[start:]
+        if not len(hits):
+            return None
+        m = start + hits.argmax()
+        return (days[m], opens[m], highs[m], closes[m]) if hits[m - start] else None
+
+    def next_below(self, k, strike_price, price):
+        # (day, Close) of the first day >= k on which the contract trades and closes at or
+        # below price, or an expiry day it trades on; None when there is none
+        days, opens, highs, closes, expiry = self.contracts[strike_price]
+        start = days.searchsorted(k)
+        hits = (closes[start:] <= price) | expiry[start:]
+        if not len(hits):
+            return None
+        m = hits.argmax()
+        return (days[start + m], closes[start + m]) if hits[m] else None
+
+    def select(self, option_chain, k, target_delta, option_type):
+        # Delta selection on day k, or None where the loop engine's selection would raise
+        days = self.days
+        try:
+            return option_chain.find_by_delta(self.dates[k], days.spot_prices[k], days.times_to_maturity[k], days.volatilities[k], target_delta, option_type)
+        except Exception:
+            return None
+
+
+# The CyclePaths of a run, built on its first use and then shared by every run on the same
+# chain, equity frame, window and option type
+def cycle_paths(stock_ticker, equity_data, option_chain, start_date, end_date, option_type):
+    key = (stock_ticker, id(equity_data), start_date, end_date, option_type)
+    entry = option_chain.prepared.get(key)
+    if entry is None or entry[0] is not equity_data:
+        entry = (equity_data, CyclePaths(stock_ticker, equity_data, option_chain, start_date, end_date, option_type))
+        option_chain.prepared[key] = entry
+    return entry[1]
+
+
+def backtest_options_vectorized(stock_ticker, equity_data, options_data, start_date, end_date, total_exposure, dte, sl=1, target_delta=0.25, max_reentries=0, reentry_type = "asap", option_type = "call"):
+    # Closed positions are kept as dicts and copied into the TradeBook column by column at the end
+    option_trades = []
+    reentry_count = 0
+    if (option_type == "put"):
+        target_delta = -1*target_delta
+    option_chain = options_data if isinstance(options_data, OptionChainIndex) else OptionChainIndex(options_data)
+    paths = cycle_paths(stock_ticker, equity_data, option_chain, start_date, end_date, option_type)
+    dates, days_to_expiry, is_expiry_day, expiry_positions = paths.dates, paths.days.days_to_expiry, paths.days.is_expiry_day, paths.expiry_positions
+    n = len(paths)
+
+    def close_position(position, k, exit_price, sl_label):
+        position['Options PNL'] = (position['Option Initial Price'] - exit_price) * position['lot_size']
+        position['Option Close Date'] = dates[k]
+        position['Option Final Price'] = exit_price
+        position['Option SL'] = sl_label
+        option_trades.append(dict(position))
+
+    def reenter(position, k, price, strike=None):
+        position['Re-entry'] = True
+        position['Option Open Date'] = dates[k]
+        position['Option Initial Price'] = price
+        position['Reentry Count'] = reentry_count + 1
+        if strike is not None:
+            position['Option Strike'] = strike
+
+    k = 0
+    while k < n:
+        # Entry: first day inside the DTE window on which the delta selection succeeds
+        entry = None
+        for j in np.flatnonzero(days_to_expiry[k:] <= dte) + k:
+            option_target_delta = paths.select(option_chain, j, target_delta, option_type)
+            if option_target_delta is not None:
+                entry = j
+                break
+        if entry is None:
+            break
+        option_initial_price = option_target_delta['Close']
+        option_entry_price = option_initial_price
+        current_position = {
+            'ticker': stock_ticker,
+            'Option Open Date': dates[entry],
+            'Spot Price': paths.days.spot_prices[entry],
+            'Option Strike': option_target_delta['Strike Price'],
+            'Option Initial Price': option_initial_price,
+            'Option Final Price': 0,
+            'Option Close Date': 0,
+            'Options PNL': 0,
+            'lot_size': total_exposure / paths.days.spot_prices[entry],
+            'Options SL': 0,
+            'Re-entry': False,
+            'Reentry Count': reentry_count
+        }
+        reentry_count = 0
+        option_open = True
+        k = entry + 1
+
+        # Holding: jump from event to event until the position is closed at expiry
+        while k < n:
+            if option_open:
+                threshold = (1 + sl) * current_position['Option Initial Price']
+                event = paths.next_sl(k, current_position['Option Strike'], threshold)
+                if event is None:
+                    k = n
+                    break
+                m, day_open, day_high, day_close = event
+                if day_open >= threshold:
+                    close_position(current_position, m, day_open, 'Overnight SL Hit')
+                    option_open = False
+                elif day_high >= threshold:
+                    close_position(current_position, m, threshold, 'Intraday SL Hit')
+                    option_open = False
+            else:
+                # Waiting after an SL: the next re-entry opportunity or the expiry
+                can_reenter = reentry_count < max_reentries
+                if can_reenter and reentry_type == "cost":
+                    event = paths.next_below(k, current_position['Option Strike'], option_entry_price)
+                    m, day_close = event if event is not None else (None, None)
+                elif can_reenter and reentry_type == "asap":
+                    m = k
+                else:
+                    expiry = expiry_positions.searchsorted(k)
+                    m = expiry_positions[expiry] if expiry < len(expiry_positions) else None
+                if m is None:
+                    k = n
+                    break
+
+            # Re-entry on day m, after an SL on the same day or while waiting. day_close is the
+            # Close of the contract held (or just closed) on day m, which it traded on.
+            if not option_open and reentry_count < max_reentries:
+                if reentry_type == "cost":
+                    if day_close <= option_entry_price:
+                        reenter(current_position, m, day_close)
+                        option_open = True
+                        reentry_count += 1
+                elif reentry_type == "asap":
+                    option_target_delta = paths.select(option_chain, m, target_delta, option_type)
+                    if option_target_delta is None:
+                        k = m + 1  # the loop engine skips the rest of a day whose selection fails
+                        continue
+                    option_entry_price = option_target_delta['Close']
+                    day_close = option_entry_price
+                    reenter(current_position, m, option_target_delta['Close'], option_target_delta['Strike Price'])
+                    option_open = True
+                    reentry_count += 1
+
+            # Expiry on day m closes whatever is still open
+            if is_expiry_day[m]:
+                if option_open:
+                    close_position(current_position, m, day_close, 'No SL Hit')
+                k = m + 1
+                break
+            k = m + 1
+
+    fields = [name for name, _ in TRADE_FIELDS + STATUS_FIELDS]
+    return TradeBook.from_columns({name: [trade.get(name, '' if name == 'Option SL' else 0) for trade in option_trades] for name in fields},
+                                  len(option_trades))
@@ -0,0 +1,338 @@
+# options_kernel.py
+import math
+import numpy as np
+import pandas as pd
+
+from option_chain import OptionChainIndex, build_date_index
+from expiry_calendar import ExpiryCalendar
+from volatility import get_volatility
+from tradebook import TradeBook
+
+# options_kernel.py
+#
+# The per-day position logic of backtest_options (options_backtest.py) and its Nifty-hedged
+# variant (options_backtest_nifty.py) as one typed kernel over plain NumPy arrays. It is
+# compiled with Numba when Numba is installed and runs as ordinary Python otherwise. Where the
+# loop engines hit an exception (no quote for the held contract, a failed delta selection) and
+# their try/except skipped the rest of the day, the kernel skips the rest of the day too, so
+# the tradebooks are identical.
+
+try:
+    from numba import njit
+except ImportError:
+    njit = None
+
+def jit(function):
+    return njit(cache=True)(function) if njit is not None else function
+
+RISK_FREE_RATE = 0.07
+REENTRY_TYPES = {"asap": 0, "cost": 1}
+SL_LABELS = {0: 'No SL Hit', 1: 'Overnight SL Hit', 2: 'Intraday SL Hit'}
+
+# Columns of the kernel's output rows, and of the structured trade records built from them
+RECORD_FIELDS = ['open_day', 'close_day', 'spot_price', 'strike', 'initial_price', 'final_price', 'pnl', 'lot_size',
+                 'nifty_spot_price', 'nifty_strike', 'nifty_initial_price', 'nifty_final_price', 'nifty_lot_size', 'nifty_pnl',
+                 're_entry', 'reentry_count', 'sl_code']
+RECORD_DTYPE = np.dtype([('open_day', np.int64), ('close_day', np.int64), ('spot_price', np.float64), ('strike', np.float32),
+                         ('initial_price', np.float64), ('final_price', np.float64), ('pnl', np.float64), ('lot_size', np.float64),
+                         ('nifty_spot_price', np.float64), ('nifty_strike', np.float32), ('nifty_initial_price', np.float64),
+                         ('nifty_final_price', np.float64), ('nifty_lot_size', np.float64), ('nifty_pnl', np.float64),
+                         ('re_entry', np.bool_), ('reentry_count', np.int64), ('sl_code', np.int8)])
+
+
+@jit
+def normal_cdf(x):
+    # Same branches as scipy's ndtr
+    z = x * 0.7071067811865476
+    if abs(z) < 0.7071067811865476:
+        return 0.5 + 0.5 * math.erf(z)
+    y = 0.5 * math.erfc(abs(z))
+    return 1.0 - y if z > 0 else y
+
+@jit
+def bs_delta(S, K, T, sigma, r, is_call):
+    # Black-Scholes delta with NumPy's nan/inf results where plain math would raise
+    if not (K > 0.0) or not (T >= 0.0):
+        return math.nan
+    ratio = S / K
+    if not (ratio > 0.0):
+        return math.nan if ratio != 0.0 else (0.0 if is_call else -1.0)  # log(0) = -inf, d1 = -inf
+    denominator = sigma * math.sqrt(T)
+    numerator = math.log(ratio) + (r + 0.5 * sigma ** 2) * T
+    if denominator == 0.0:
+        if numerator == 0.0 or math.isnan(numerator):
+            return math.nan
+        d1 = math.inf if numerator > 0 else -math.inf
+    else:
+        d1 = numerator / denominator
+    return normal_cdf(d1) if is_call else -normal_cdf(-d1)
+
+@jit
+def select_row(strikes, low, high, spot_price, time_to_maturity, volatility, target_delta, is_call):
+    # Row whose delta is closest to target_delta (first on ties), or -1 if none has a delta
+    best = -1
+    best_diff = math.inf
+    for row in range(low, high):
+        diff = abs(bs_delta(spot_price, strikes[row], time_to_maturity, volatility, RISK_FREE_RATE, is_call) - target_delta)
+        if diff < best_diff:
+            best = row
+            best_diff = diff
+    if best < 0:
+        for row in range(low, high):
+            if not math.isnan(abs(bs_delta(spot_price, strikes[row], time_to_maturity, volatility, RISK_FREE_RATE, is_call) - target_delta)):
+                return row  # all distances are +inf
+    return best
+
+@jit
+def find_row(strikes, low, high, strike_price):
+    # First row in [low, high) with this strike (strikes ascending there), or -1
+    end = high
+    while low < high:
+        middle = (low + high) // 2
+        if strikes[middle] < strike_price:
+            low = middle + 1
+        else:
+            high = middle
+    if low < end and strikes[low] == strike_price:
+        return low
+    return -1
+
+@jit
+def backtest_kernel(days_to_expiry, is_expiry_day, times_to_maturity,
+                    spot_prices, volatilities, chain_lows, chain_highs, strikes, opens, highs, closes,
+                    hedged, nifty_spot_prices, nifty_volatilities, nifty_lows, nifty_highs,
+                    nifty_strikes, nifty_opens, nifty_highs_, nifty_closes,
+                    total_exposure, dte, sl, target_delta, max_reentries, reentry_type, is_call):
+    n = len(days_to_expiry)
+    out = np.zeros((2 * n + 1, 17))  # at most an SL and an expiry close per day
+    count = 0
+
+    option_entry_price = math.nan
+    re_entry_open = False
+    reentry_count = 0
+    is_position_open = False
+    option_open = False
+    is_expiry = False
+    # Current position (one row of out, filled in place)
+    position = np.zeros(17)
+
+    for k in range(n):
+        if not is_position_open and days_to_expiry[k] <= dte:
+            row = select_row(strikes, chain_lows[k], chain_highs[k], spot_prices[k], times_to_maturity[k], volatilities[k], target_delta, is_call)
+            if row < 0:
+                continue
+            nifty_row = -1
+            if hedged:
+                nifty_row = select_row(nifty_strikes, nifty_lows[k], nifty_highs[k], nifty_spot_prices[k], times_to_maturity[k], nifty_volatilities[k], target_delta, is_call)
+                if nifty_row < 0:
+                    continue
+            option_entry_price = closes[row]
+            position[:] = 0.0
+            position[0] = k
+            position[2] = spot_prices[k]
+            position[3] = strikes[row]
+            position[4] = closes[row]
+            position[7] = total_exposure / spot_prices[k]
+            if hedged:
+                position[8] = nifty_spot_prices[k]
+                position[9] = nifty_strikes[nifty_row]
+                position[10] = nifty_closes[nifty_row]
+                position[12] = total_exposure / nifty_spot_prices[k]
+            position[15] = reentry_count
+            option_open = True
+            is_position_open = True
+            re_entry_open = False
+            reentry_count = 0
+            is_expiry = False
+            continue
+
+        if is_position_open:
+            row = find_row(strikes, chain_lows[k], chain_highs[k], position[3])
+            nifty_row = find_row(nifty_strikes, nifty_lows[k], nifty_highs[k], position[9]) if hedged else -1
+            if option_open:
+                if row < 0:
+                    continue
+                threshold = (1 + sl) * position[4]
+                sl_code = 0
+                if opens[row] >= threshold:
+                    sl_code = 1
+                elif highs[row] >= threshold:
+                    sl_code = 2
+                if sl_code > 0:
+                    if hedged and nifty_row < 0:
+                        continue
+                    exit_price = opens[row] if sl_code == 1 else threshold
+                    position[6] = (position[4] - exit_price) * position[7]
+                    position[1] = k
+                    position[5] = exit_price
+                    position[16] = sl_code
+                    if hedged:
+                        nifty_exit_price = nifty_opens[nifty_row] if sl_code == 1 else nifty_highs_[nifty_row]
+                        position[13] = (position[10] - nifty_exit_price) * position[12]
+                        position[11] = nifty_exit_price
+                    option_open = False
+                    re_entry_open = True
+                    out[count, :] = position
+                    count += 1
+
+            if re_entry_open and not option_open and reentry_count < max_reentries:
+                if reentry_type == 1:
+                    if row < 0:
+                        continue
+                    if closes[row] <= option_entry_price:
+                        position[14] = 1.0
+                        position[0] = k
+                        position[4] = closes[row]
+                        position[15] = reentry_count + 1
+                        option_open = True
+                        reentry_count += 1
+                        re_entry_open = False
+                elif reentry_type == 0:
+                    new_row = select_row(strikes, chain_lows[k], chain_highs[k], spot_prices[k], times_to_maturity[k], volatilities[k], target_delta, is_call)
+                    if new_row < 0:
+                        continue
+                    option_entry_price = closes[new_row]
+                    position[14] = 1.0
+                    position[0] = k
+                    position[3] = strikes[new_row]
+                    position[4] = closes[new_row]
+                    position[15] = reentry_count + 1
+                    option_open = True
+                    reentry_count += 1
+                    re_entry_open = False
+
+            if not is_expiry and is_expiry_day[k]:
+                is_expiry = True
+
+            if is_expiry:
+                if option_open:
+                    row = find_row(strikes, chain_lows[k], chain_highs[k], position[3])
+                    if row < 0 or (hedged and nifty_row < 0):
+                        continue
+                    position[6] = (position[4] - closes[row]) * position[7]
+                    position[1] = k
+                    position[5] = closes[row]
+                    if hedged:
+                        position[13] = (position[10] - nifty_closes[nifty_row]) * position[12]
+                        position[11] = nifty_closes[nifty_row]
+                    option_open = False
+                    position[16] = 0
+                    out[count, :] = position
+                    count += 1
+                is_position_open = False
+
+    return out[:count]
+
+
+class BacktestDays:
+    # Per-day arrays for the days the loop engine acts on: inside the window, with an equity
+    # row and an options chain (and a row in required_dates, e.g. the Nifty index, if given).
+    # Position k in every array is the k-th such day. Equity dates are expected in ascending
+    # order, as the loop engine also assumes.
+    def __init__(self, stock_ticker, equity_data, option_chain, start_date, end_date, option_type, required_dates=None):
+        stock_data, stock_rows = build_date_index(equity_data, stock_ticker)
+        spot_prices = stock_data['EQ_Close'].to_numpy()
+        volatilities = get_volatility(stock_data, stock_ticker)
+
+        dates = equity_data['Date'].unique()
+        timeline = pd.to_datetime(dates).values.astype('datetime64[D]')
+        expiry_calendar = ExpiryCalendar.from_option_chain(timeline, option_chain)
+        after_end = np.flatnonzero(timeline > np.datetime64(end_date, 'D'))
+        stop = after_end[0] if len(after_end) else len(dates)
+        start_day = np.datetime64(start_date, 'D')
+        days = [day for day in range(stop) if timeline[day] >= start_day and dates[day] in stock_rows and dates[day] in option_chain
+                and (required_dates is None or dates[day] in required_dates)]
+
+        self.dates = dates[days]
+        rows = np.array([stock_rows[date] for date in self.dates], dtype=np.int64)
+        self.spot_prices = spot_prices[rows] if len(rows) else np.empty(0)
+        self.volatilities = volatilities[rows] if len(rows) else np.empty(0)
+        self.times_to_maturity = expiry_calendar.time_to_maturity[days]
+        self.days_to_expiry = expiry_calendar.days_to_expiry[days]
+        self.is_expiry_day = expiry_calendar.is_expiry_day[days]
+
+    def __len__(self):
+        return len(self.dates)
+
+
+# Arrays the kernel reads for one leg: per-day [low, high) row ranges of the option type in the
+# chain (empty on days without a chain) plus the chain's strike and price columns
+def chain_arrays(option_chain, dates, option_type):
+    lows = np.zeros(len(dates), dtype=np.int64)
+    highs = np.zeros(len(dates), dtype=np.int64)
+    for k, date in enumerate(dates):
+        if date in option_chain:
+            lows[k], highs[k] = option_chain.type_range(date, option_type)
+    prices = option_chain.prices
+    return lows, highs, option_chain.strikes, prices['Open'], prices['High'], prices['Close']
+
+# The kernel only runs full-window backtests on historical volatility and daily bars; options the
+# loop engines take beyond that are refused rather than silently ignored
+def check_kernel_options(stats=None, volatility_source="historical", intraday_data=None, state=None):
+    unsupported = [name for name, given in (('stats', stats is not None), ('volatility_source', volatility_source != "historical"),
+                                            ('intraday_data', bool(intraday_data)), ('state', state is not None)) if given]
+    if unsupported:
+        raise ValueError(f"engine='kernel' does not support: {', '.join(unsupported)}; use the loop engine")
+
+def run_kernel(stock_ticker, equity_data, options_data, start_date, end_date, total_exposure, dte, sl=1, target_delta=0.25,
+               max_reentries=0, reentry_type="asap", option_type="call", nifty_options_data=None, nifty_index_data=None):
+    # Prepare the arrays, run the kernel and return (trade records structured array, dates)
+    if (option_type == "put"):
+        target_delta = -1*target_delta
+    hedged = nifty_options_data is not None
+    option_chain = options_data if isinstance(options_data, OptionChainIndex) else OptionChainIndex(options_data)
+
+    index_rows = None
+    if hedged:
+        nifty_option_chain = nifty_options_data if isinstance(nifty_options_data, OptionChainIndex) else OptionChainIndex(nifty_options_data)
+        index_data, index_rows = build_date_index(nifty_index_data)
+    days = BacktestDays(stock_ticker, equity_data, option_chain, start_date, end_date, option_type, required_dates=index_rows)
+
+    stock_leg = chain_arrays(option_chain, days.dates, option_type)
+    if hedged:
+        rows = np.array([index_rows[date] for date in days.dates], dtype=np.int64)
+        nifty_spot_prices = index_data['Close'].to_numpy(dtype=np.float64)[rows]
+        nifty_volatilities = get_volatility(index_data, 'NIFTY', close_column='Close')[rows]
+        nifty_leg = chain_arrays(nifty_option_chain, days.dates, option_type)
+    else:
+        nifty_spot_prices = nifty_volatilities = np.zeros(len(days))
+        empty = np.zeros(len(days), dtype=np.int64)
+        nifty_leg = (empty, empty, np.zeros(1, dtype=np.float32), np.zeros(1), np.zeros(1), np.zeros(1))
+
+    out = backtest_kernel(days.days_to_expiry, days.is_expiry_day, days.times_to_maturity,
+                          days.spot_prices.astype(np.float64), days.volatilities, *stock_leg,
+                          hedged, nifty_spot_prices, nifty_volatilities, *nifty_leg,
+                          float(total_exposure), dte, float(sl), float(target_delta), max_reentries,
+                          REENTRY_TYPES.get(reentry_type, -1), option_type == "call")
+
+    records = np.zeros(len(out), dtype=RECORD_DTYPE)
+    for column, field in enumerate(RECORD_FIELDS):
+        records[field] = out[:, column]
+    return records, days.dates
+
+# Kernel records -> the TradeBook the loop engines return, filled a column at a time
+def records_to_trades(records, dates, stock_ticker, hedged=False):
+    columns = {
+        'ticker': stock_ticker,
+        'Option Open Date': dates[records['open_day']],
+        'Spot Price': records['spot_price'],
+        'Option Strike': records['strike'],
+        'Option Initial Price': records['initial_price'],
+        'Option Final Price': records['final_price'],
+        'Option Close Date': dates[records['close_day']],
+        'Options PNL': records['pnl'],
+        'lot_size': records['lot_size'],
+        'Re-entry': records['re_entry'],
+        'Reentry Count': records['reentry_count'],
+        'Option SL': np.array([SL_LABELS[code] for code in range(len(SL_LABELS))])[records['sl_code'].astype(np.int64)],
+    }
+    if hedged:
+        columns.update({
+            'Nifty Spot Price': records['nifty_spot_price'],
+            'Nifty Option Strike': records['nifty_strike'],
+            'Nifty Option Final Price': records['nifty_final_price'],
+            'Nifty Option Initial Price': records['nifty_initial_price'],
+            'Nifty lot_size': records['nifty_lot_size'],
+            'Nifty Options PNL': records['nifty_pnl'],
+        })
+    return TradeBook.from_columns(columns, len(records), hedged)
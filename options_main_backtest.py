@@ -1,9 +1,18 @@
 # options_main_backtest.py
 
+import os
 import pandas as pd
-import multiprocessing as mp
-from datetime import datetime
 from options_backtest import backtest_options  # Importing from the options backtest module
+from data_loader import load_ticker_window, update_window
+from options_panel import backtest_options_panel
+from scheduler import run_scheduled, estimate_ticker_cost
+from tradebook import TradebookAggregator, trades_to_records, trade_dtype
+from instrumentation import BacktestStats, NULL_STATS, stats_frame, phase_totals
+from option_chain import OptionChainIndex
+from selection_cache import SelectionCache, selection_cache_path
+from mark_to_market import ticker_marks, PortfolioCurve
+from intraday_data import intraday_readers, close_readers
+from strategy_state import config_key, state_path, load_state, save_state, clear_state
 
 # Define tickers
 tickers = ["RELIANCE", "TCS", "INFY", "HDFCBANK", "ICICIBANK", "HINDUNILVR", "KOTAKBANK", "SBIN",
@@ -21,45 +30,105 @@ target_delta = 0.35
 option_type = "call"
 mode = "sell"
 reentry_type = "asap"
+total_exposure = 700000
+volatility_source = "historical"  # "implied" selects strikes on market-implied delta (implied_volatility.py)
+intraday_sl = False  # Evaluate the SL on minute bars where Stocks_Data/{ticker}_Opt_1min.csv exists (intraday_data.py)
+panel_mode = False  # Advance all tickers together in one process (options_panel.py) instead of one pool task per ticker
+use_selection_cache = True  # Keep delta strike selections on disk across runs (selection_cache.py)
+mark_to_market = True  # Mark every open leg to market daily for the portfolio equity curve (mark_to_market.py)
+margin_rate = 0.2  # Approximate margin blocked per rupee of short option exposure
+update_mode = False  # Resume each ticker from its saved engine state, run only the new EOD bars and append to the tradebook (strategy_state.py)
+resume_states = False  # Set by the parent in update mode when every ticker's state and the tradebook they belong to exist
+instrument = False  # Collect per-ticker phase timings and counters (instrumentation.py) into Tradebooks/Backtest_Stats.csv
 
 import warnings
 # Suppress only SettingWithCopyWarning
 warnings.simplefilter(action="ignore", category=pd.errors.SettingWithCopyWarning)
 
+# Pool initializer - whether the workers resume from the saved states or replay the whole history
+def init_worker(resume):
+    global resume_states
+    resume_states = resume
+
+# Parameters the engine state of an incremental run belongs to
+def strategy_config():
+    return {'strategy': 'short_option', 'sl': sl, 'dte': dte, 'target_delta': target_delta, 'max_reentries': max_reentries, 'reentry_type': reentry_type,
+            'option_type': option_type, 'volatility_source': volatility_source, 'intraday_sl': intraday_sl, 'total_exposure': total_exposure}
+
 # Create a function to run the options backtest for each stock
 def run_options_backtest(ticker):
-    equity_data = pd.read_csv(f'Stocks_Data/{ticker}_EQ_EOD.csv')
-    options_data = pd.read_csv(f'Stocks_Data/{ticker}_Opt_EOD.csv')
-
-    # Set the start and end dates for backtesting
-    start_date_eq = equity_data['Date'].iloc[0]
-    start_date = (datetime.strptime(start_date_eq, "%Y-%m-%d") + pd.DateOffset(months=0)).strftime("%Y-%m-%d")
-    end_date = (datetime.strptime(start_date, "%Y-%m-%d") + pd.DateOffset(months=66)).strftime("%Y-%m-%d")
+    stats = BacktestStats(ticker) if instrument else NULL_STATS
+    # An incremental run reads only the bars after the state's last date (plus volatility lookback);
+    # without saved states it replays the whole window and starts a new state
+    state = (load_state(state_path(ticker, strategy_config())) if resume_states else {}) if update_mode else None
+    window = update_window(ticker, state['last_date']) if state else (None, None)
+    if state and window[0] > window[1]:
+        print(f"Options Backtest for {ticker}: up to date ({state['last_date']})")
+        return {"ticker": ticker, "Options PNL": 0, "Options Records": trades_to_records([]), "Stats": stats.summary() if instrument else None}
+    # Only the columns and the backtest window (plus volatility lookback) the run reads
+    equity_data, options_data, start_date, end_date = load_ticker_window(ticker, *window, stats=stats)
+    stats.lap('load')
+    option_chain = OptionChainIndex(options_data, selection_cache=SelectionCache(selection_cache_path(ticker)) if use_selection_cache else None)
+    stats.lap('data slice')
 
     stock_ticker = f'{ticker}.EQ-NSE'
-    total_exposure = 700000
 
     # Run the options backtest
+    intraday_data = None
     try:
-        options_trades = backtest_options(stock_ticker, equity_data, options_data, start_date, end_date, total_exposure, dte, sl, target_delta = target_delta, max_reentries=max_reentries, reentry_type = reentry_type, option_type=option_type)
-        options_trades_df = pd.DataFrame(options_trades)
+        # Minute bars are read from the first date the run processes
+        intraday_data = intraday_readers(ticker, start_date=start_date) if intraday_sl else None
+        options_trades = backtest_options(stock_ticker, equity_data, option_chain, start_date, end_date, total_exposure, dte, sl, target_delta = target_delta, max_reentries=max_reentries, reentry_type = reentry_type, option_type=option_type, stats=stats, volatility_source=volatility_source,
+                                          intraday_data=intraday_data, state=state)
+        option_chain.save_selections()
+        options_records = trades_to_records(options_trades)
 
         # Calculate final PNL
-        final_options_pnl = options_trades_df['Options PNL'].sum()
+        final_options_pnl = options_records['Options PNL'].sum()
 
         print(f"Options Backtest for {ticker}: Options PNL: {final_options_pnl}")
 
         return {
             "ticker": ticker,
             "Options PNL": final_options_pnl,
-            "Options Tradebook": options_trades_df
+            "Options Records": options_records,
+            "Marks": ticker_marks(options_records, equity_data, option_chain, stock_ticker, start_date, end_date, option_type) if mark_to_market and not update_mode else None,
+            # Saved by the parent once the records are in the tradebook
+            "State": state,
+            "Stats": stats.summary() if instrument else None
         }
-    except:
+    except Exception as error:
+        stats.failed(error)
         return {
             "ticker": ticker,
             "Options PNL": 0,
-            "Options Tradebook": pd.DataFrame()
+            "Options Records": trades_to_records([]),
+            "Stats": stats.summary() if instrument else None
         }
+    finally:
+        close_readers(intraday_data)
+
+# Panel mode - one pass over the whole universe, sharing what is common to all tickers
+def run_panel_backtest(tickers):
+    universe = []
+    for ticker in tickers:
+        equity_data, options_data, start_date, end_date = load_ticker_window(ticker)
+        # Indexed once, for the panel and the daily marks
+        universe.append((f'{ticker}.EQ-NSE', equity_data, OptionChainIndex(options_data), start_date, end_date))
+
+    panel_trades = backtest_options_panel(universe, total_exposure, dte, sl, target_delta = target_delta, max_reentries=max_reentries, reentry_type = reentry_type, option_type=option_type)
+    results = []
+    for ticker, (stock_ticker, equity_data, option_chain, start_date, end_date) in zip(tickers, universe):
+        options_records = trades_to_records(panel_trades[stock_ticker])
+        final_options_pnl = options_records['Options PNL'].sum()
+        print(f"Options Backtest for {ticker}: Options PNL: {final_options_pnl}")
+        results.append({
+            "ticker": ticker,
+            "Options PNL": final_options_pnl,
+            "Options Records": options_records,
+            "Marks": ticker_marks(options_records, equity_data, option_chain, stock_ticker, start_date, end_date, option_type) if mark_to_market else None
+        })
+    return results
 
 # Function to calculate Max Drawdown
 def calculate_max_drawdown(cumulative_pnl):
@@ -69,44 +138,55 @@ def calculate_max_drawdown(cumulative_pnl):
 
 # Use multiprocessing to run the options backtest in parallel
 if __name__ == "__main__":
-    pool = mp.Pool(mp.cpu_count())  # Use all available CPU cores
-
-    # Map the tickers to the run_options_backtest function
-    results = pool.map(run_options_backtest, tickers)
+    # Each ticker's records are folded into the monthly totals and appended to the tradebook
+    # CSV as they arrive, so the full tradebook is never built in memory
+    tradebook_path = "Tradebooks/Options_Tradebook_"+option_type+"_" + str(sl)+"_"+str(dte)+str(target_delta)+".csv"
+    config = strategy_config()
+    if update_mode:
+        # Named by the states' config key: parameters outside the name above get their own tradebook
+        tradebook_path = tradebook_path.replace('.csv', f'_{config_key(config)}.csv')
+    # New bars are appended only when every ticker can resume; otherwise the whole history is
+    # replayed into a rewritten tradebook, and the states it supersedes are dropped first
+    resume = update_mode and os.path.exists(tradebook_path) and all(os.path.exists(state_path(ticker, config)) for ticker in tickers)
+    if update_mode and not resume:
+        for ticker in tickers:
+            clear_state(state_path(ticker, config))
+    aggregator = TradebookAggregator(['Options PNL'], signs={'Options PNL': -1} if mode == "buy" else None, path=tradebook_path, append=resume)
+
+    # Daily marks of each ticker, combined into the portfolio equity curve at the end
+    curve = PortfolioCurve(['Options PNL'], signs={'Options PNL': -1} if mode == "buy" else None, margin_rate=margin_rate)
+
+    def collect(ticker, result):
+        aggregator.add(result.pop('Options Records'))
+        curve.add(ticker, result.pop('Marks', None))
+        # Only after its trades are written, so a failed run never resumes past unrecorded trades
+        state = result.pop('State', None)
+        if state:
+            save_state(state_path(ticker, config), state, config)
+        return result
+
+    # Incremental runs resume per-ticker engine state, so they always go through the pool
+    panel = panel_mode and not update_mode
+    if panel:
+        results = [collect(result['ticker'], result) for result in run_panel_backtest(tickers)]
+    else:
+        # Longest tickers first, one at a time, on all available CPU cores
+        results, task_timings = run_scheduled(run_options_backtest, tickers, costs=[estimate_ticker_cost(ticker) for ticker in tickers],
+                                              initializer=init_worker, initargs=(resume,), callback=collect)
+    if instrument and not panel:
+        # Where each ticker's time went, and what its loop skipped or swallowed
+        stats_df = stats_frame(result['Stats'] for result in results)
+        stats_df.to_csv("Tradebooks/Backtest_Stats.csv", index=False)
+        print(phase_totals(stats_df))
+    aggregator.close(columns=list(trade_dtype().names))
 
-    # Close the pool to free up resources
-    pool.close()
-    pool.join()
-
-    # Process the results after options backtesting
-    options_tradebook_df = pd.DataFrame()
-
-    for result in results:
-        options_tradebook_df = pd.concat([options_tradebook_df, result['Options Tradebook']], ignore_index=True)
-
-    # Save the options tradebook to CSV
-    options_tradebook_df.to_csv("Tradebooks/Options_Tradebook_"+option_type+"_" + str(sl)+"_"+str(dte)+str(target_delta)+".csv", index=False)
-
-    if mode == "buy":
-        options_tradebook_df['Options PNL'] = options_tradebook_df['Options PNL']*-1
     # Calculate and print the total PNL for all stocks
-    total_options_pnl = options_tradebook_df['Options PNL'].sum()
+    total_options_pnl = aggregator.total_pnl()
     print(f"\nTotal Options PNL for all stocks: {total_options_pnl:.2f}")
 
-    # Add 'Year' and 'Month' columns to calculate yearly and monthly PNL
-    options_tradebook_df['Option Open Date'] = pd.to_datetime(options_tradebook_df['Option Open Date'])
-    options_tradebook_df['Year'] = options_tradebook_df['Option Open Date'].dt.year
-    options_tradebook_df['Month'] = options_tradebook_df['Option Open Date'].dt.to_period('M')
-
-    # Group by 'Year' and sum the PNL for yearly PNL
-    yearly_pnl_df = options_tradebook_df.groupby('Year').agg({
-        'Options PNL': 'sum'
-    }).reset_index()
-
-    # Group by 'Month' and sum the PNL for monthly PNL
-    monthly_pnl_df = options_tradebook_df.groupby('Month').agg({
-        'Options PNL': 'sum'
-    }).reset_index()
+    # Yearly and monthly PNL from the streamed monthly totals
+    yearly_pnl_df = aggregator.yearly_pnl()
+    monthly_pnl_df = aggregator.monthly_pnl()
     monthly_pnl_df.to_csv("Call_Sell_Monthly_PNL"+str(dte)+" "+str(target_delta)+".csv")
     # Calculate cumulative P&L for max drawdown
     cum_pnl = monthly_pnl_df['Options PNL'].cumsum()
@@ -115,6 +195,14 @@ if __name__ == "__main__":
     max_drawdown = calculate_max_drawdown(cum_pnl)
     print(f"\nMax Drawdown: {max_drawdown:.2f}")
 
+    if mark_to_market and not update_mode:
+        # Daily marks catch the intramonth drawdowns the monthly buckets above hide
+        equity_curve_df = curve.equity_curve()
+        equity_curve_df = equity_curve_df.join(curve.rolling_stats().drop(columns='Date').add_prefix('Rolling '))
+        equity_curve_df.to_csv(tradebook_path.replace('.csv', '_Equity_Curve.csv'), index=False)
+        print(f"\nDaily Max Drawdown (mark-to-market): {curve.max_drawdown():.2f}")
+        print(f"Peak Exposure: {equity_curve_df['Exposure'].max():.2f}, Peak Margin: {equity_curve_df['Margin'].max():.2f}")
+
     # Calculate Average Yearly Returns
     average_yearly_returns = yearly_pnl_df['Options PNL'].mean()
     print(f"\nAverage Yearly Returns: {average_yearly_returns:.2f} Rupees")
@@ -0,0 +1,134 @@
+# options_panel.py
+import pandas as pd
+import numpy as np
+
+from volatility import get_volatility
+from option_chain import build_date_index
+from expiry_calendar import ExpiryCalendar
+from tradebook import TradeBook
+from options_strategy import Underlying, LegPosition, as_chain, run_strategy_day, short_option_strategy, nifty_hedged_strategy
+
+# options_panel.py
+#
+# Panel mode: every ticker of the universe is stacked into one long (date, ticker) timeline
+# and advanced together a date at a time, instead of one independent backtest per ticker.
+# Each ticker runs the strategy engine's leg positions (options_strategy.py) on its own
+# underlying, so per-ticker tradebooks are the same as those of options_backtest /
+# options_backtest_nifty. The Nifty hedge leg only depends on the date (and on the strike
+# being held), so its spot, volatility, delta selections and quotes are computed once per
+# date and shared by all tickers.
+
+
+class NiftyLeg(Underlying):
+    # The Nifty underlying shared by every ticker of a panel run, moved to a date with advance().
+    # Selections and quotes are made once per date; a failed selection is remembered and raised
+    # again for every ticker asking for it.
+    def __init__(self, nifty_options_data, nifty_index_data):
+        data, rows = build_date_index(nifty_index_data)
+        super().__init__('nifty', data, rows, 'Close', get_volatility(data, 'NIFTY', close_column='Close'), as_chain(nifty_options_data))
+
+    def advance(self, date):
+        super().advance(date)
+        self.selections = {}
+        self.quotes = {}
+
+    def select(self, leg, time_to_maturity):
+        key = (leg.target_delta, leg.option_type, time_to_maturity)
+        if key not in self.selections:
+            try:
+                self.selections[key] = super().select(leg, time_to_maturity)
+            except Exception as error:
+                self.selections[key] = error
+        selection = self.selections[key]
+        if isinstance(selection, Exception):
+            raise selection
+        return selection
+
+    def quote(self, strike_price, option_type):
+        key = (strike_price, option_type)
+        if key not in self.quotes:
+            self.quotes[key] = super().quote(strike_price, option_type)
+        return self.quotes[key]
+
+
+class PanelTicker:
+    # One ticker's leg positions over its own stock underlying (and the shared Nifty one),
+    # advanced a day at a time by step()
+    def __init__(self, strategy, stock_ticker, equity_data, options_data, start_date, end_date, total_exposure, nifty=None):
+        self.strategy = strategy
+        self.stock_ticker = stock_ticker
+        self.total_exposure = total_exposure
+
+        data, rows = build_date_index(equity_data, stock_ticker)
+        self.stock = Underlying('stock', data, rows, 'EQ_Close', get_volatility(data, stock_ticker), as_chain(options_data))
+        self.underlyings = {'stock': self.stock}
+        if nifty is not None:
+            self.underlyings['nifty'] = nifty
+
+        # Same window rule as the loop: days from start_date up to the first one after end_date
+        self.dates = equity_data['Date'].unique()
+        self.timeline = pd.to_datetime(self.dates).values.astype('datetime64[D]')
+        expiry_calendar = ExpiryCalendar.from_option_chain(self.timeline, self.stock.option_chain)
+        self.times_to_maturity = expiry_calendar.time_to_maturity
+        self.days_to_expiry = expiry_calendar.days_to_expiry
+        self.is_expiry_day = expiry_calendar.is_expiry_day
+        after_end = np.flatnonzero(self.timeline > np.datetime64(end_date, 'D'))
+        stop = after_end[0] if len(after_end) else len(self.dates)
+        self.window = np.flatnonzero(self.timeline[:stop] >= np.datetime64(start_date, 'D'))
+
+        self.option_trades = TradeBook(dtype=strategy.dtype)
+        self.positions = [LegPosition(leg, strategy.hedges[leg.name], stock_ticker, self.option_trades, len(strategy.traded) > 1)
+                          for leg in strategy.traded]
+
+    def step(self, day):
+        # Day `day` of this ticker's timeline; the shared Nifty underlying is already on this date
+        date = self.dates[day]
+        if any(date not in underlying.rows for underlying in self.underlyings.values()):
+            return
+        self.stock.advance(date)
+        if date not in self.stock.option_chain:
+            return
+        run_strategy_day(self.strategy, self.positions, self.underlyings, date, self.times_to_maturity[day], self.days_to_expiry[day],
+                         self.is_expiry_day[day], self.total_exposure)
+
+
+def panel_timeline(tickers):
+    # The long (date, ticker) structure: one row per in-window day of every ticker, sorted by
+    # date and then by the ticker's place in the universe
+    panel = pd.DataFrame({
+        'Day': np.concatenate([ticker.timeline[ticker.window] for ticker in tickers]),
+        'Ticker': np.repeat(np.arange(len(tickers)), [len(ticker.window) for ticker in tickers]),
+        'Ticker Day': np.concatenate([ticker.window for ticker in tickers]),
+    })
+    return panel.sort_values(['Day', 'Ticker'], kind='stable', ignore_index=True)
+
+
+def backtest_options_panel(universe, total_exposure, dte, sl=1, target_delta=0.25, max_reentries=0, reentry_type = "asap", option_type = "call",
+                           nifty_options_data=None, nifty_index_data=None):
+    # universe: (stock_ticker, equity_data, options_data, start_date, end_date) per ticker.
+    # Returns {stock_ticker: option_trades}. With nifty_options_data / nifty_index_data the
+    # positions carry the Nifty hedge leg, as in options_backtest_nifty.
+    if nifty_options_data is not None:
+        strategy = nifty_hedged_strategy(dte, sl, target_delta, max_reentries, reentry_type, option_type)
+        nifty = NiftyLeg(nifty_options_data, nifty_index_data)
+    else:
+        strategy = short_option_strategy(dte, sl, target_delta, max_reentries, reentry_type, option_type)
+        nifty = None
+    tickers = [PanelTicker(strategy, stock_ticker, equity_data, options_data, start_date, end_date, total_exposure, nifty)
+               for stock_ticker, equity_data, options_data, start_date, end_date in universe]
+
+    panel = panel_timeline(tickers)
+    days = panel['Day'].to_numpy()
+    ticker_positions = panel['Ticker'].to_numpy()
+    ticker_days = panel['Ticker Day'].to_numpy()
+    bounds = np.flatnonzero(np.r_[True, days[1:] != days[:-1], True])
+
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        if nifty is not None:
+            date = tickers[ticker_positions[start]].dates[ticker_days[start]]
+            if date in nifty.rows:
+                nifty.advance(date)
+        for row in range(start, stop):
+            tickers[ticker_positions[row]].step(ticker_days[row])
+
+    return {ticker.stock_ticker: ticker.option_trades for ticker in tickers}
@@ -0,0 +1,424 @@
+# options_strategy.py
+import pandas as pd
+import numpy as np
+
+from volatility import get_volatility, resume_volatility, volatility_state
+from option_chain import OptionChainIndex, build_date_index
+from expiry_calendar import ExpiryCalendar
+from tradebook import TradeBook, trade_dtype
+from instrumentation import NULL_STATS
+from implied_volatility import ImpliedDeltaChain
+from intraday_data import intraday_sl_exit, price_at_time
+
+# options_strategy.py
+#
+# Leg-based loop engine. A Strategy declares its option legs (underlying, option type, target
+# delta, side and SL rule) and backtest_strategy advances all of them in one pass over the
+# dates: each date's spot price and volatility are read once per underlying, and its time to
+# maturity and expiry flags once for the whole strategy. Legs are selected on the first day
+# within dte of expiry, and whatever is still open closes on the expiry day. Each traded leg
+# (with its hedges) runs that cycle on its own: its day's work is guarded separately, so when
+# it raises (a contract without a quote, a failed selection) only the rest of that leg's day
+# is skipped, exactly as a single-leg run would skip it, and the other legs' SL, re-entry and
+# expiry checks still run. With complete data all legs enter and expire together.
+#   traded leg - own SL at (1 + sl) x its entry price (sl=None holds to expiry) and its own
+#                re-entries; one tradebook row per exit, in the Option ... columns (plus a
+#                'Leg' column when the strategy trades more than one leg)
+#   hedge leg  - follows=<traded leg>: opened with the position and priced out each time the
+#                leg it follows exits (at the Open on an overnight SL, the High on an intraday
+#                SL, the Close at expiry), in its own '<name> ...' columns of that row
+# With intraday data (intraday_data.IntradayReader per underlying) a traded leg's SL is
+# evaluated on the held contract's minute bars instead of the daily Open / High: the exit is
+# the first bar that reaches the stop, filled at the stop or at the bar's open when it gapped
+# through, and its hedges are priced at that bar's time from their own bars. Days without
+# bars for the contract fall back to the daily check.
+# side does not change the tradebook, whose PnL columns stay (initial - final) * lot size as
+# in every engine; signs() gives the aggregator the bought legs' flip, like the runners' mode.
+# options_backtest and options_backtest_nifty are the configurations short_option_strategy
+# and nifty_hedged_strategy of this engine.
+# With a `state` dict the engine runs incrementally (strategy_state.py): it resumes from the
+# open positions, counters and volatility windows a previous run left in it, processes only
+# the dates after its last_date and leaves its own end state there for the next run.
+
+UNDERLYINGS = ('stock', 'nifty')
+
+
+class Leg:
+    def __init__(self, name='Option', underlying='stock', option_type='call', target_delta=0.25, side='sell', sl=1, follows=None):
+        if underlying not in UNDERLYINGS:
+            raise ValueError(f"Unknown underlying: {underlying}")
+        self.name = name
+        self.underlying = underlying
+        self.option_type = option_type
+        self.target_delta = -1*target_delta if option_type == "put" else target_delta
+        self.side = side
+        self.sl = sl
+        self.follows = follows
+
+
+class Strategy:
+    def __init__(self, legs, dte, max_reentries=0, reentry_type="asap"):
+        self.legs = list(legs)
+        self.dte = dte
+        self.max_reentries = max_reentries
+        self.reentry_type = reentry_type
+        self.traded = [leg for leg in self.legs if leg.follows is None]
+        self.hedges = {leg.name: [hedge for hedge in self.legs if hedge.follows == leg.name] for leg in self.traded}
+        if not self.traded or sum(len(hedges) for hedges in self.hedges.values()) != len(self.legs) - len(self.traded):
+            raise ValueError("A strategy needs a traded leg, and every hedge leg must follow one")
+        if len({leg.side for leg in self.traded}) > 1:
+            raise ValueError("Traded legs share the Options PNL column, so they need the same side; make the other side a hedge leg")
+        # The stock's dates drive the loop even when no leg trades its options
+        self.underlyings = list(dict.fromkeys(['stock'] + [leg.underlying for leg in self.legs]))
+        self.dtype = trade_dtype(hedges=[leg.name for leg in self.legs if leg.follows is not None], leg_column=len(self.traded) > 1)
+
+    def pnl_columns(self):
+        return ['Options PNL'] + [f'{leg.name} Options PNL' for leg in self.legs if leg.follows is not None]
+
+    def signs(self):
+        signs = {'Options PNL': -1} if self.traded[0].side == "buy" else {}
+        signs.update((f'{leg.name} Options PNL', -1) for leg in self.legs if leg.follows is not None and leg.side == "buy")
+        return signs
+
+
+# options_backtest: one short option on the stock
+def short_option_strategy(dte, sl=1, target_delta=0.25, max_reentries=0, reentry_type="asap", option_type="call", side="sell"):
+    return Strategy([Leg('Option', 'stock', option_type, target_delta, side, sl)], dte, max_reentries, reentry_type)
+
+# options_backtest_nifty: the stock option and a Nifty option of the same type and delta, closed with it
+def nifty_hedged_strategy(dte, sl=1, target_delta=0.25, max_reentries=0, reentry_type="asap", option_type="call", side="sell", hedge_side="buy"):
+    return Strategy([Leg('Option', 'stock', option_type, target_delta, side, sl),
+                     Leg('Nifty', 'nifty', option_type, target_delta, hedge_side, follows='Option')], dte, max_reentries, reentry_type)
+
+
+class Underlying:
+    # Spot prices, volatilities and option chain of one underlying, moved to a date with advance()
+    def __init__(self, name, data, rows, spot_column, volatilities, option_chain):
+        self.name = name
+        self.data = data
+        self.spot_column = spot_column
+        self.rows = rows
+        self.spot_prices = data[spot_column].to_numpy()
+        self.volatilities = volatilities
+        self.option_chain = option_chain
+
+    def advance(self, date):
+        self.date = date
+        self.spot_price = self.spot_prices[self.rows[date]]
+        self.volatility = self.volatilities[self.rows[date]]
+
+    def select(self, leg, time_to_maturity):
+        return self.option_chain.find_by_delta(self.date, self.spot_price, time_to_maturity, self.volatility, leg.target_delta, leg.option_type)
+
+    def quote(self, strike_price, option_type):
+        return self.option_chain.quote(self.date, strike_price, option_type)
+
+# A prebuilt OptionChainIndex can be passed in place of an options frame to share it across runs
+def as_chain(options_data):
+    return options_data if options_data is None or isinstance(options_data, OptionChainIndex) else OptionChainIndex(options_data)
+
+# volatility_states (underlying -> VolatilityProvider state) continues a previous run's windows
+def load_underlyings(strategy, stock_ticker, equity_data, options_data, nifty_options_data=None, nifty_index_data=None, volatility_states=None):
+    volatility_states = volatility_states or {}
+    underlyings = {}
+    for name in strategy.underlyings:
+        if name == 'stock':
+            data, rows = build_date_index(equity_data, stock_ticker)
+            spot_column, key, option_chain = 'EQ_Close', stock_ticker, as_chain(options_data)
+        else:
+            data, rows = build_date_index(nifty_index_data)
+            spot_column, key, option_chain = 'Close', 'NIFTY', as_chain(nifty_options_data)
+        if name in volatility_states:
+            volatilities = resume_volatility(volatility_states[name], data, spot_column)
+        else:
+            # Historical volatility, cached per ticker across runs and never written back into equity_data
+            volatilities = get_volatility(data, key, close_column=spot_column)
+        underlyings[name] = Underlying(name, data, rows, spot_column, volatilities, option_chain)
+    return underlyings
+
+
+class LegPosition:
+    # One traded leg's position state (with its hedge legs' columns), kept across expiry cycles
+    def __init__(self, leg, hedges, stock_ticker, option_trades, leg_column=False):
+        self.leg = leg
+        self.hedges = hedges
+        self.stock_ticker = stock_ticker
+        self.option_trades = option_trades
+        self.leg_column = leg_column
+        self.option_entry_price = None
+        self.re_entry_open = False
+        self.reentry_count = 0
+        self.option_open = False
+        self.current_position = {}
+        # In an expiry cycle (from entry until the expiry close), and whether its expiry day has come
+        self.in_cycle = False
+        self.is_expiry = False
+
+    def enter(self, date, underlyings, time_to_maturity, total_exposure):
+        # Select this leg and its hedges and open the cycle's position
+        selections = {leg.name: underlyings[leg.underlying].select(leg, time_to_maturity) for leg in [self.leg] + self.hedges}
+        self.open(date, selections, underlyings, total_exposure)
+        self.in_cycle = True
+        self.is_expiry = False
+
+    def run_day(self, date, underlyings, time_to_maturity, is_expiry_day, max_reentries, reentry_type, intraday=None):
+        # One quote per leg for the day, shared by its SL, re-entry and expiry checks
+        underlying = underlyings[self.leg.underlying]
+        quotes = {leg.name: underlyings[leg.underlying].quote(strike_price, leg.option_type) for leg, strike_price in self.strikes()}
+        self.check_sl(date, quotes, intraday)
+        self.check_reentry(date, quotes, underlying, time_to_maturity, max_reentries, reentry_type)
+
+        # End of the month - close the position
+        if not self.is_expiry and is_expiry_day:
+            self.is_expiry = True
+
+        if self.is_expiry:
+            self.expire(date, quotes, underlying)
+            self.in_cycle = False
+
+    def open(self, date, selections, underlyings, total_exposure):
+        option_target_delta = selections[self.leg.name]
+        spot_price = underlyings[self.leg.underlying].spot_price
+        self.option_entry_price = option_target_delta['Close']
+        position = {
+            'ticker': self.stock_ticker,
+            'Option Open Date': date,
+            'Spot Price': spot_price,
+            'Option Strike': option_target_delta['Strike Price'],
+            'Option Initial Price': option_target_delta['Close'],
+            'Option Final Price': 0,
+            'Option Close Date': 0,
+            'Options PNL': 0,
+            'lot_size': total_exposure / spot_price,
+        }
+        for hedge in self.hedges:
+            hedge_spot_price = underlyings[hedge.underlying].spot_price
+            position.update({
+                f'{hedge.name} Spot Price': hedge_spot_price,
+                f'{hedge.name} Option Strike': selections[hedge.name]['Strike Price'],
+                f'{hedge.name} Option Final Price': 0,
+                f'{hedge.name} Option Initial Price': selections[hedge.name]['Close'],
+                f'{hedge.name} Option Close Date': 0,
+                f'{hedge.name} lot_size': total_exposure / hedge_spot_price,
+                f'{hedge.name} Options PNL': 0,
+            })
+        position.update({'Options SL': 0, 'Re-entry': False, 'Reentry Count': self.reentry_count})
+        if self.leg_column:
+            position['Leg'] = self.leg.name
+        self.current_position = position
+        self.option_open = True
+        self.re_entry_open = False
+        self.reentry_count = 0
+
+    def state(self):
+        return {'current_position': self.current_position, 'option_open': self.option_open, 're_entry_open': self.re_entry_open,
+                'reentry_count': self.reentry_count, 'option_entry_price': self.option_entry_price,
+                'in_cycle': self.in_cycle, 'is_expiry': self.is_expiry}
+
+    def restore(self, state):
+        self.in_cycle = state['in_cycle']
+        self.is_expiry = state['is_expiry']
+        self.current_position = dict(state['current_position'])
+        self.option_open = state['option_open']
+        self.re_entry_open = state['re_entry_open']
+        self.reentry_count = state['reentry_count']
+        self.option_entry_price = state['option_entry_price']
+
+    def strikes(self):
+        # (leg, strike held) of this leg and its hedges
+        position = self.current_position
+        return [(self.leg, position['Option Strike'])] + [(hedge, position[f'{hedge.name} Option Strike']) for hedge in self.hedges]
+
+    def check_sl(self, date, quotes, intraday=None):
+        if not self.option_open or self.leg.sl is None:
+            return
+        option_quote = quotes[self.leg.name]
+        threshold = (1 + self.leg.sl) * self.current_position['Option Initial Price']
+        if intraday and self.leg.underlying in intraday:
+            bars = intraday[self.leg.underlying].contract_bars(date, self.current_position['Option Strike'], self.leg.option_type)
+            if len(bars['Time']):
+                self.check_intraday_sl(date, quotes, intraday, bars, threshold)
+                return
+        if option_quote['Open'] >= threshold:  # SL hit overnight
+            self.close(date, option_quote['Open'], 'Overnight SL Hit', quotes, 'Open')
+        elif option_quote['High'] >= threshold:  # SL hit intraday
+            self.close(date, threshold, 'Intraday SL Hit', quotes, 'High')
+
+    def check_intraday_sl(self, date, quotes, intraday, bars, threshold):
+        sl_exit = intraday_sl_exit(bars, threshold)
+        if sl_exit is None:
+            return
+        option_exit_price, sl_label, time = sl_exit
+        overnight = sl_label == 'Overnight SL Hit'
+        hedge_price = 'Open' if overnight else 'High'
+        # Hedges at the exit bar's time where they have bars of their own, else at the daily field
+        hedge_quotes = dict(quotes)
+        for hedge in self.hedges:
+            if hedge.underlying in intraday:
+                hedge_bars = intraday[hedge.underlying].contract_bars(date, self.current_position[f'{hedge.name} Option Strike'], hedge.option_type)
+                price = price_at_time(hedge_bars, time, overnight)
+                if price is not None:
+                    hedge_quotes[hedge.name] = {hedge_price: price}
+        self.close(date, option_exit_price, sl_label, hedge_quotes, hedge_price)
+
+    def check_reentry(self, date, quotes, underlying, time_to_maturity, max_reentries, reentry_type):
+        # Re-entry after an SL exit, within max_reentries: at cost once the Close is back to the
+        # original entry price, or asap on a fresh delta selection
+        if not (self.re_entry_open and self.option_open is False and self.reentry_count < max_reentries):
+            return
+        if reentry_type == "cost":
+            option_price_close = quotes[self.leg.name]['Close']
+            if option_price_close <= self.option_entry_price:
+                self.reenter(date, option_price_close)
+        elif reentry_type == "asap":
+            option_target_delta = underlying.select(self.leg, time_to_maturity)
+            self.option_entry_price = option_target_delta['Close']
+            self.reenter(date, option_target_delta['Close'], option_target_delta['Strike Price'])
+
+    def expire(self, date, quotes, underlying):
+        if not self.option_open:
+            return
+        option_quote = quotes[self.leg.name]
+        # An asap re-entry earlier in the day has moved the leg to another strike
+        if option_quote['Strike Price'] != self.current_position['Option Strike']:
+            option_quote = underlying.quote(self.current_position['Option Strike'], self.leg.option_type)
+        self.close(date, option_quote['Close'], 'No SL Hit', quotes, 'Close')
+
+    def close(self, date, option_exit_price, sl_label, quotes, hedge_price):
+        position = self.current_position
+        position['Options PNL'] = (position['Option Initial Price'] - option_exit_price) * position['lot_size']
+        position['Option Close Date'] = date
+        position['Option Final Price'] = option_exit_price
+        # Same field order as the loop engines had: an SL exit labels the trade before pricing
+        # the hedges, an expiry exit after them
+        if sl_label == 'No SL Hit':
+            self.close_hedges(quotes, hedge_price)
+            position['Option SL'] = sl_label
+        else:
+            position['Option SL'] = sl_label
+            self.close_hedges(quotes, hedge_price)
+            self.re_entry_open = True
+        self.option_open = False
+        self.option_trades.append(position)
+
+    def close_hedges(self, quotes, hedge_price):
+        position = self.current_position
+        for hedge in self.hedges:
+            hedge_exit_price = quotes[hedge.name][hedge_price]
+            position[f'{hedge.name} Options PNL'] = (position[f'{hedge.name} Option Initial Price'] - hedge_exit_price) * position[f'{hedge.name} lot_size']
+            position[f'{hedge.name} Option Final Price'] = hedge_exit_price
+
+    def reenter(self, date, price, strike_price=None):
+        position = self.current_position
+        position['Re-entry'] = True
+        position['Option Open Date'] = date
+        if strike_price is not None:
+            position['Option Strike'] = strike_price
+        position['Option Initial Price'] = price
+        position['Reentry Count'] = self.reentry_count + 1
+        self.option_open = True
+        self.reentry_count += 1
+        self.re_entry_open = False
+
+
+# One date of a strategy, its underlyings already moved to it: legs outside a cycle enter on a
+# day within dte (which ends that day for them), the others run their day. Each leg is guarded
+# on its own; what it raises skips the rest of its day and is counted in stats.
+def run_strategy_day(strategy, positions, underlyings, date, time_to_maturity, days_to_expiry, is_expiry_day, total_exposure,
+                     intraday_data=None, stats=NULL_STATS):
+    for position in positions:
+        try:
+            if not position.in_cycle:
+                if days_to_expiry <= strategy.dte:
+                    position.enter(date, underlyings, time_to_maturity, total_exposure)
+                continue
+            position.run_day(date, underlyings, time_to_maturity, is_expiry_day, strategy.max_reentries, strategy.reentry_type, intraday_data)
+        except Exception as error:
+            stats.swallowed(error)
+
+
+def backtest_strategy(strategy, stock_ticker, equity_data, options_data, start_date, end_date, total_exposure,
+                      nifty_options_data=None, nifty_index_data=None, stats=None, volatility_source="historical", intraday_data=None,
+                      state=None):
+    # stats (instrumentation.BacktestStats) times and counts the engine's phases; the Nifty
+    # chain's calls are charged to the "nifty" ones. volatility_source="implied" selects strikes
+    # on market-implied delta (implied_volatility.py): each chain's implied volatilities are
+    # solved for the whole window up front, the historical volatility only standing in for
+    # strikes without one. intraday_data maps an underlying ('stock' / 'nifty') to the
+    # intraday_data.IntradayReader its SL checks read minute bars from. state is the
+    # incremental run's state dict, updated in place (empty for the first run).
+    stats = stats if stats is not None else NULL_STATS
+    stats.start()
+    option_trades = TradeBook(dtype=strategy.dtype)
+    resume = state.get('last_date') if state is not None else None
+    volatility_states = state['volatility'] if resume is not None else None
+    underlyings = load_underlyings(strategy, stock_ticker, equity_data, options_data, nifty_options_data, nifty_index_data, volatility_states)
+    stock_rows = underlyings['stock'].rows
+    # Expiry calendar and the days the loop trades come from the first traded leg's chain
+    primary = underlyings[strategy.traded[0].underlying]
+    stats.lap('data slice')
+
+    # Dates are parsed once into a datetime64 timeline; everything date-derived the loop needs
+    # (window checks, time to maturity, days to expiry, expiry days) is precomputed from it
+    dates = equity_data['Date'].unique()
+    timeline = pd.to_datetime(dates).values.astype('datetime64[D]')
+    start_day, end_day = np.datetime64(start_date, 'D'), np.datetime64(end_date, 'D')
+    if resume is not None:
+        start_day = max(start_day, np.datetime64(resume, 'D') + 1)
+    expiry_calendar = ExpiryCalendar.from_option_chain(timeline, primary.option_chain)
+    times_to_maturity = expiry_calendar.time_to_maturity
+    days_to_expiry = expiry_calendar.days_to_expiry
+    window = np.flatnonzero((timeline >= start_day) & (timeline <= end_day))
+    if state is not None and len(window) and days_to_expiry[window[-1]] == 1 and not (expiry_calendar.trading_days > timeline[window[-1]]).any():
+        # The day before a scheduled expiry is the expiry day only when the next day has no
+        # chain, which the data cannot tell yet on its last day: that day waits for the next run
+        window = window[:-1]
+        end_day = timeline[window[-1]] if len(window) else start_day - 1
+    stats.lap('expiry check')
+    traded_underlyings = [underlyings[name] for name in dict.fromkeys(leg.underlying for leg in strategy.legs)]
+    if volatility_source == "implied":
+        window_days = [day for day in np.flatnonzero((timeline >= start_day) & (timeline <= end_day)) if dates[day] in stock_rows]
+        for underlying in traded_underlyings:
+            days = [day for day in window_days if dates[day] in underlying.rows]
+            underlying.option_chain = ImpliedDeltaChain.from_days(underlying.option_chain, dates[days], underlying.spot_prices[[underlying.rows[dates[day]] for day in days]],
+                                                                  times_to_maturity[days])
+        stats.lap('implied volatility')
+    for underlying in traded_underlyings:
+        underlying.option_chain = stats.wrap(underlying.option_chain, leg='' if underlying.name == 'stock' else underlying.name)
+    for reader in (intraday_data or {}).values():
+        reader.contract_bars = stats.timed('intraday bars', reader.contract_bars)
+
+    positions = [LegPosition(leg, strategy.hedges[leg.name], stock_ticker, option_trades, len(strategy.traded) > 1) for leg in strategy.traded]
+    if resume is not None:
+        for position in positions:
+            position.restore(state['legs'][position.leg.name])
+    for day, date in enumerate(dates):
+        if timeline[day] > end_day:
+            break
+        if timeline[day] < start_day:
+            continue
+
+        if any(date not in underlying.rows for underlying in underlyings.values()):
+            continue
+        time_to_maturity = times_to_maturity[day]
+        for underlying in underlyings.values():
+            underlying.advance(date)
+
+        if date not in primary.option_chain:
+            continue
+
+        run_strategy_day(strategy, positions, underlyings, date, time_to_maturity, days_to_expiry[day], expiry_calendar.is_expiry_day[day],
+                         total_exposure, intraday_data, stats)
+
+    stats.lap('loop')
+    if state is not None and len(window):
+        last_date = dates[window[-1]]
+        state.update({
+            'last_date': last_date,
+            'legs': {position.leg.name: position.state() for position in positions},
+            'volatility': {name: volatility_state(underlying.data, last_date, underlying.spot_column, (volatility_states or {}).get(name))
+                           for name, underlying in underlyings.items()},
+        })
+    stats.count_days(dates, timeline, start_day, end_day, *[underlying.rows for underlying in underlyings.values()], primary.option_chain)
+    stats.count_trades(option_trades)
+    return option_trades
@@ -0,0 +1,155 @@
+# options_sweep.py
+
+import itertools
+import functools
+import multiprocessing as mp
+import numpy as np
+import pandas as pd
+from data_loader import load_ticker_window
+from option_chain import OptionChainIndex
+from selection_cache import SelectionCache, selection_cache_path
+from options_backtest import backtest_options
+from options_backtest_vectorized import backtest_options_vectorized
+from options_main_backtest import tickers
+from scheduler import run_scheduled, estimate_ticker_cost
+from tradebook import TradebookAggregator, trades_to_records, trade_dtype, write_shard
+from mark_to_market import ticker_marks, max_drawdown, PortfolioCurve
+
+# Parameter grid - every combination is run against the same loaded data
+param_grid = {
+    'sl': [1, 2],
+    'dte': [15, 20],
+    'target_delta': [0.25, 0.35],
+    'max_reentries': [0],
+    'reentry_type': ["asap"],
+    'option_type': ["call"],
+}
+total_exposure = 700000
+# "loop", "kernel" (options_kernel.py) or "vectorized" (options_backtest_vectorized.py) - all produce the same tradebook.
+# The loop and vectorized engines select strikes through the chain, and so through the
+# selection cache; the kernel makes its own selections and bypasses it.
+engine = "vectorized"
+split_params = None  # Split a ticker's combinations over several tasks (None: only when there are fewer tickers than CPU cores)
+shard_dir = "Tradebooks/Sweep_Shards"  # Workers save their records here and send back only the path (None to send the records)
+mark_to_market = True  # Daily marks per run, for each combination's portfolio equity curve and drawdown
+use_selection_cache = True  # Share delta strike selections across workers and runs through disk (selection_cache.py)
+
+engines = {"loop": backtest_options, "kernel": functools.partial(backtest_options, engine="kernel"), "vectorized": backtest_options_vectorized}
+
+import warnings
+# Suppress only SettingWithCopyWarning
+warnings.simplefilter(action="ignore", category=pd.errors.SettingWithCopyWarning)
+
+def expand_grid(param_grid):
+    keys = list(param_grid)
+    return [dict(zip(keys, values)) for values in itertools.product(*param_grid.values())]
+
+# Load and preprocess a ticker for the sweep. A worker keeps only the last ticker it loaded,
+# so its memory stays bounded by one ticker however many combinations it runs. Each task
+# covers one ticker, so the ticker is loaded once per task: once in all unless split_params
+# spreads its combinations over a few tasks. Combinations that only differ in sl,
+# max_reentries or reentry_type make the same delta selections; with use_selection_cache
+# those are also found on disk when another worker made them first (loop and vectorized
+# engines only).
+@functools.lru_cache(maxsize=1)
+def load_sweep_ticker(ticker):
+    equity_data, options_data, start_date, end_date = load_ticker_window(ticker)
+    selection_cache = SelectionCache(selection_cache_path(ticker)) if use_selection_cache else None
+    return equity_data, OptionChainIndex(options_data, selection_cache=selection_cache), start_date, end_date
+
+# Parameter values typed from the whole grid, so every run's records share one dtype
+def grid_params(params, param_grid=param_grid):
+    return {name: np.asarray(value, dtype=np.asarray(param_grid[name]).dtype) for name, value in params.items()}
+
+# One parameter combination on one ticker: (trade records with the parameters as columns, summary
+# row, daily marks or None)
+def run_sweep_pair(ticker, params, engine=engine, param_grid=param_grid):
+    equity_data, option_chain, start_date, end_date = load_sweep_ticker(ticker)
+    stock_ticker = f'{ticker}.EQ-NSE'
+    try:
+        options_trades = engines[engine](stock_ticker, equity_data, option_chain, start_date, end_date, total_exposure, **params)
+    except:
+        options_trades = []
+    option_chain.save_selections()
+    options_records = trades_to_records(options_trades, extra=grid_params(params, param_grid))
+    summary = {'ticker': ticker, **params, 'Trades': len(options_records), 'Options PNL': options_records['Options PNL'].sum()}
+    marks = None
+    if mark_to_market:
+        marks = ticker_marks(options_records, equity_data, option_chain, stock_ticker, start_date, end_date, params.get('option_type', 'call'))
+        summary['Daily Max Drawdown'] = max_drawdown(marks['Options PNL'].to_numpy())
+    return options_records, summary, marks
+
+def sweep_result(ticker, options_records, summary, marks, name, shard_dir=shard_dir):
+    return {
+        "ticker": ticker,
+        "Sweep Records": write_shard(options_records, shard_dir, name) if shard_dir else options_records,
+        "Sweep Summary": pd.DataFrame(summary),
+        "Sweep Marks": marks
+    }
+
+# Scheduler task for split_params: task is (ticker, group, groups), the group-th of the
+# ticker's combinations split into `groups` interleaved groups
+def run_sweep_task(task, engine=engine, param_grid=param_grid, shard_dir=shard_dir):
+    ticker, group, groups = task
+    return run_parameter_sweep(ticker, param_grid, engine, shard_dir, expand_grid(param_grid)[group::groups], f'{ticker}_{group}')
+
+# Load and preprocess one ticker once, then run every parameter combination (or the given
+# ones) on it. The options chain index (and the delta selections memoized on it) and the
+# ticker's cached volatility series are shared by all runs.
+def run_parameter_sweep(ticker, param_grid=param_grid, engine=engine, shard_dir=shard_dir, combinations=None, name=None):
+    records = []
+    summary = []
+    marks = []
+    for params in combinations if combinations is not None else expand_grid(param_grid):
+        options_records, params_summary, params_marks = run_sweep_pair(ticker, params, engine, param_grid)
+        records.append(options_records)
+        summary.append(params_summary)
+        marks.append(params_marks)
+
+    print(f"Parameter sweep for {ticker}: {len(summary)} combinations")
+    return sweep_result(ticker, np.concatenate(records), summary, marks, name or ticker, shard_dir)
+
+if __name__ == "__main__":
+    # Records are appended to the sweep tradebook as each task finishes; only the small
+    # summaries are kept in memory
+    aggregator = TradebookAggregator(path="Tradebooks/Sweep_Tradebook.csv")
+
+    # One portfolio curve per parameter combination, fed with every ticker's daily marks
+    param_columns = list(param_grid)
+    curves = {}
+
+    def collect(task, result):
+        aggregator.add(result.pop('Sweep Records'))
+        for summary, marks in zip(result['Sweep Summary'].to_dict('records'), result.pop('Sweep Marks')):
+            key = tuple(summary[column] for column in param_columns)
+            curves.setdefault(key, PortfolioCurve()).add(summary['ticker'], marks)
+        return result
+
+    # Longest tickers first on all available CPU cores, one task at a time
+    ticker_costs = {ticker: estimate_ticker_cost(ticker) for ticker in tickers}
+    workers = mp.cpu_count()
+    if split_params or (split_params is None and len(tickers) < workers):
+        # Each ticker's combinations in just enough groups to keep every core busy, so a
+        # ticker is loaded by that many workers at most
+        groups = min(-(-workers // len(tickers)), len(expand_grid(param_grid)))
+        tasks = [(ticker, group, groups) for ticker in tickers for group in range(groups)]
+        results, task_timings = run_scheduled(functools.partial(run_sweep_task, engine=engine, param_grid=param_grid), tasks,
+                                              costs=[ticker_costs[ticker] for ticker, *_ in tasks], processes=workers, callback=collect)
+    else:
+        results, task_timings = run_scheduled(functools.partial(run_parameter_sweep, param_grid=param_grid, engine=engine), tickers,
+                                              costs=[ticker_costs[ticker] for ticker in tickers], processes=workers, callback=collect)
+    aggregator.close(columns=list(trade_dtype(extra=grid_params(expand_grid(param_grid)[0])).names))
+    task_timings.to_csv("Tradebooks/Sweep_Timings.csv", index=False)
+
+    sweep_summary_df = pd.concat([result['Sweep Summary'] for result in results], ignore_index=True)
+    sweep_summary_df.to_csv("Tradebooks/Sweep_Summary.csv", index=False)
+
+    # Total PNL of each parameter combination across all tickers
+    print(sweep_summary_df.groupby(param_columns)[['Trades', 'Options PNL']].sum().sort_values('Options PNL', ascending=False))
+
+    if mark_to_market:
+        # Portfolio daily max drawdown and peak exposure of each combination
+        portfolio_df = pd.DataFrame([{**dict(zip(param_columns, key)), 'Daily Max Drawdown': curve.max_drawdown(),
+                                      'Peak Exposure': curve.equity_curve()['Exposure'].max()} for key, curve in curves.items()])
+        portfolio_df.to_csv("Tradebooks/Sweep_Portfolio.csv", index=False)
+        print(portfolio_df.sort_values('Daily Max Drawdown', ascending=False))
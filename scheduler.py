@@ -0,0 +1,68 @@
+# scheduler.py
+import os
+import time
+import multiprocessing as mp
+import pandas as pd
+
+# scheduler.py
+#
+# Longest-first dispatch for the multiprocessing runners. pool.map splits the task list into
+# fixed chunks up front, so a chunk holding a long ticker (RELIANCE, HDFCBANK) keeps its worker
+# busy while the others go idle at the tail. Here tasks are sorted by an estimated cost and
+# handed out one at a time with imap_unordered(chunksize=1), so whichever worker is free takes
+# the next most expensive task.
+
+
+# Cost of a ticker's backtest, estimated from the size of its data files (the options file
+# dominates: the backtest's work grows with the number of option rows)
+def estimate_ticker_cost(ticker, data_dir='Stocks_Data'):
+    cost = 0
+    for path in (f'{data_dir}/{ticker}_Opt_EOD.csv', f'{data_dir}/{ticker}_EQ_EOD.csv'):
+        if os.path.exists(path):
+            cost += os.path.getsize(path)
+    return cost
+
+
+class TimedTask:
+    # Picklable wrapper that runs func(task) in a worker and reports how long it took
+    def __init__(self, func):
+        self.func = func
+
+    def __call__(self, item):
+        position, task = item
+        started = time.perf_counter()
+        result = self.func(task)
+        return position, result, time.perf_counter() - started, os.getpid()
+
+
+def run_scheduled(func, tasks, costs=None, processes=None, initializer=None, initargs=(), maxtasksperchild=None, verbose=True, callback=None):
+    # Run func over tasks on a pool, most expensive first. Returns (results in the order of
+    # `tasks`, per-task timing DataFrame). costs defaults to 0 for every task (input order).
+    # maxtasksperchild recycles workers to bound their memory on long runs. callback(task, result)
+    # is called in the parent as each result arrives and its return value is kept in its place.
+    if costs is None:
+        costs = [0] * len(tasks)
+    order = sorted(range(len(tasks)), key=lambda position: costs[position], reverse=True)
+    results = [None] * len(tasks)
+    timings = []
+
+    started = time.perf_counter()
+    pool = mp.Pool(processes or mp.cpu_count(), initializer=initializer, initargs=initargs, maxtasksperchild=maxtasksperchild)
+    try:
+        for done, (position, result, seconds, pid) in enumerate(
+                pool.imap_unordered(TimedTask(func), [(position, tasks[position]) for position in order], chunksize=1), 1):
+            results[position] = callback(tasks[position], result) if callback is not None else result
+            timings.append({'Task': tasks[position], 'Cost': costs[position], 'Seconds': seconds, 'Worker': pid,
+                            'Finished': time.perf_counter() - started})
+            if verbose:
+                print(f"[{done}/{len(tasks)}] {tasks[position]} finished in {seconds:.2f}s")
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+    timings_df = pd.DataFrame(timings, columns=['Task', 'Cost', 'Seconds', 'Worker', 'Finished'])
+    if verbose and len(timings_df):
+        wall = time.perf_counter() - started
+        print(f"{len(tasks)} tasks in {wall:.2f}s wall, {timings_df['Seconds'].sum():.2f}s of task time, slowest {timings_df['Seconds'].max():.2f}s")
+    return results, timings_df
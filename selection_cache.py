@@ -0,0 +1,106 @@
+# selection_cache.py
+import os
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+# selection_cache.py
+#
+# Persistent memo of delta strike selections for one underlying. A selection is a pure
+# function of the day's chain and (spot, time to maturity, volatility, target delta, option
+# type), so it is stored under exactly those inputs, together with a CRC of the day's strikes
+# (the chain fingerprint): when the chain of a date changes, its old selections no longer
+# match and are recomputed. Only the selected strike is kept; its prices come from the chain.
+# Entries are held in LRU order, bounded by max_entries, and saved as one structured .npy per
+# underlying next to the data cache ({data_dir}/.cache/selections/{name}.npy). save() merges
+# with what is on disk, so workers sharing an underlying (split sweeps, the Nifty leg) add to
+# the file rather than overwrite each other's entries; a concurrent save may still drop the
+# entries of the other worker, which then only cost a recomputation on the next run.
+
+SELECTION_DTYPE = np.dtype([('date', 'U10'), ('spot_price', 'f8'), ('time_to_maturity', 'f8'), ('volatility', 'f8'),
+                            ('target_delta', 'f8'), ('option_type', 'U4'), ('fingerprint', 'u4'), ('strike', 'f4')])
+KEY_FIELDS = ['date', 'spot_price', 'time_to_maturity', 'volatility', 'target_delta', 'option_type']
+
+
+def selection_cache_path(name, data_dir='Stocks_Data'):
+    return os.path.join(data_dir, '.cache', 'selections', f'{name}.npy')
+
+def strikes_fingerprint(strikes):
+    return zlib.crc32(np.ascontiguousarray(strikes, dtype=np.float32).tobytes())
+
+
+class SelectionCache:
+    # Keys are OptionChainIndex.find_by_delta's (date, spot_price, time_to_maturity, volatility,
+    # target_delta, option_type); values are (chain fingerprint, strike)
+    def __init__(self, path=None, max_entries=200000):
+        self.path = path
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.unsaved = 0
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.entries = read_selections(path)
+            self.trim()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def get(self, key, fingerprint):
+        # Selected strike, or None when the key is unknown or was selected on a different chain
+        entry = self.entries.get(key)
+        if entry is None or entry[0] != fingerprint:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry[1]
+
+    def put(self, key, fingerprint, strike):
+        self.entries[key] = (fingerprint, strike)
+        self.entries.move_to_end(key)
+        self.unsaved += 1
+        self.trim()
+
+    def trim(self):
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def save(self):
+        if self.path is None or not self.unsaved:
+            return
+        if os.path.exists(self.path):
+            # Entries only on disk go first (least recently used), then this cache's own
+            entries = read_selections(self.path)
+            for key in self.entries:
+                entries.pop(key, None)
+            entries.update(self.entries)
+            self.entries = entries
+            self.trim()
+        write_selections(self.path, self.entries)
+        self.unsaved = 0
+
+
+def read_selections(path):
+    try:
+        records = np.load(path)
+    except (OSError, ValueError):
+        return OrderedDict()
+    keys = zip(records['date'].tolist(), *(records[field].tolist() for field in KEY_FIELDS[1:]))
+    return OrderedDict(zip(keys, zip(records['fingerprint'].tolist(), records['strike'].tolist())))
+
+def write_selections(path, entries):
+    records = np.zeros(len(entries), dtype=SELECTION_DTYPE)
+    if len(entries):
+        keys, values = zip(*entries.items())
+        for field, column in zip(KEY_FIELDS, zip(*keys)):
+            records[field] = column
+        fingerprints, strikes = zip(*values)
+        records['fingerprint'] = fingerprints
+        records['strike'] = strikes
+    # Written under a per-process name and renamed into place, so readers never see a partial file
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'wb') as f:
+        np.save(f, records)
+    os.replace(tmp_path, path)
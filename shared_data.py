@@ -0,0 +1,63 @@
+# shared_data.py
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+
+from option_chain import OptionChainIndex
+
+
+# Read-only Nifty hedge data published once by the parent into shared memory. Workers get a
+# small picklable spec (segment names, dtypes, shapes, the date -> row slice map) and attach
+# NumPy views on the same pages instead of each holding its own copy of the chain.
+class SharedNiftyData:
+    def __init__(self, nifty_options_data, nifty_index_data):
+        chain = nifty_options_data if isinstance(nifty_options_data, OptionChainIndex) else OptionChainIndex(nifty_options_data)
+        self.blocks = []
+        self.spec = {
+            'slices': chain.slices,
+            'chain': {name: self.publish(values) for name, values in chain.arrays().items()},
+            'index_dates': nifty_index_data['Date'].tolist(),
+            'index': {column: self.publish(nifty_index_data[column].to_numpy())
+                      for column in nifty_index_data.columns if column != 'Date' and nifty_index_data[column].dtype.kind in 'biuf'},
+        }
+
+    def publish(self, values):
+        values = np.ascontiguousarray(values)
+        block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+        np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+        self.blocks.append(block)
+        return (block.name, values.dtype.str, values.shape)
+
+    def close(self):
+        # Called by the parent once the pool is done
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+def attach_array(block_spec, blocks):
+    name, dtype, shape = block_spec
+    try:
+        block = shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        # Python < 3.13 always registers the segment, but pool workers share the parent's
+        # resource tracker, so this only duplicates the parent's own registration
+        block = shared_memory.SharedMemory(name=name)
+    blocks.append(block)
+    values = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+    values.flags.writeable = False
+    return values
+
+# Worker side: returns (OptionChainIndex over shared arrays, Nifty index frame)
+def attach_nifty_data(spec):
+    blocks = []
+    chain_arrays = {name: attach_array(block_spec, blocks) for name, block_spec in spec['chain'].items()}
+    strikes = chain_arrays.pop('strikes')
+    type_codes = chain_arrays.pop('type_codes')
+    nifty_option_chain = OptionChainIndex.from_arrays(spec['slices'], strikes, type_codes, chain_arrays)
+    nifty_option_chain.shared_blocks = blocks  # keep the mappings alive as long as the index
+
+    # The index series is a few thousand rows; the frame built from it is a small local copy
+    index_columns = {column: attach_array(block_spec, blocks) for column, block_spec in spec['index'].items()}
+    nifty_index_data = pd.DataFrame({'Date': spec['index_dates'], **index_columns})
+    return nifty_option_chain, nifty_index_data
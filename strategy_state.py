@@ -0,0 +1,49 @@
+# strategy_state.py
+import os
+import json
+import zlib
+import numpy as np
+
+# strategy_state.py
+#
+# Persisted engine state for incremental (daily update) runs. backtest_strategy leaves in its
+# `state` dict the last date it processed, the open position and re-entry counters of every
+# traded leg and each underlying's volatility window; the next run resumes from it and only
+# processes the bars that arrived since. The state is kept as one JSON file per ticker and
+# strategy config under state_dir, named by a CRC of the config, so a run with different
+# parameters starts from scratch instead of resuming another configuration's positions. The
+# runners name an incremental run's tradebook by the same key, so the states and the tradebook
+# they were appended to always belong together.
+
+
+def config_key(config):
+    return f'{zlib.crc32(json.dumps(config, sort_keys=True).encode()):08x}'
+
+def state_path(ticker, config, state_dir='Tradebooks/.state'):
+    return os.path.join(state_dir, f'{ticker}_{config_key(config)}.json')
+
+def load_state(path):
+    # {} when there is no state yet (the first run starts from the beginning of the window)
+    try:
+        with open(path) as f:
+            return json.load(f)['state']
+    except FileNotFoundError:
+        return {}
+
+def clear_state(path):
+    if os.path.exists(path):
+        os.remove(path)
+
+def save_state(path, state, config=None):
+    # Written under a per-process name and renamed into place, so a failed run keeps the old state
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f'{path}.{os.getpid()}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump({'config': config, 'state': state}, f, default=json_value)
+    os.replace(tmp_path, path)
+
+# Positions hold NumPy scalars (prices, strikes, flags); they are stored as their Python values
+def json_value(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError(f"Cannot store {type(value).__name__} in the engine state")
@@ -0,0 +1,121 @@
+# synthetic_data.py
+import os
+import numpy as np
+import pandas as pd
+import scipy.stats as si
+
+from utilities import last_thursday_of_month_array
+
+# synthetic_data.py
+#
+# Synthetic NSE-style EOD data in the layout the backtests read:
+#   {data_dir}/Stocks_Data/{ticker}_EQ_EOD.csv  - Date, Ticker, EQ_Open, EQ_High, EQ_Low, EQ_Close
+#   {data_dir}/Stocks_Data/{ticker}_Opt_EOD.csv - Date, Ticker, Open, High, Low, Close, Volume with
+#                                                 monthly option tickers like AAA-25JAN18-540CE
+#   {data_dir}/nifty_combined_sorted_data.csv   - Nifty index Date, Open, High, Low, Close
+#   {data_dir}/Nifty_MonthlyI_Opt2019.pkl       - Nifty monthly options, same columns as above
+# Spots follow a geometric random walk; option prices are Black-Scholes values at a flat
+# volatility with OHLC noise, for the current expiry (the next month's once the last Thursday
+# has passed). Some business days are dropped as holidays and a share of option quotes is
+# missing, as in the real files. Everything is generated column-wise, so a multi-year chain
+# for dozens of tickers takes seconds.
+
+# Business days from start_date over `years` years, with holiday_rate of them dropped
+def trading_days(start_date='2018-01-01', years=3, holiday_rate=0.025, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    days = pd.bdate_range(start_date, periods=int(252 * years)).values.astype('datetime64[D]')
+    return days[rng.random(len(days)) >= holiday_rate]
+
+def generate_equity(ticker, days, start_price, daily_volatility=0.018, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    close = start_price * np.exp(np.cumsum(rng.normal(0, daily_volatility, len(days))))
+    open_ = close * (1 + rng.normal(0, daily_volatility / 6, len(days)))
+    return pd.DataFrame({
+        'Date': np.datetime_as_string(days),
+        'Ticker': ticker,
+        'EQ_Open': open_,
+        'EQ_High': np.maximum(open_, close) * (1 + np.abs(rng.normal(0, daily_volatility / 3, len(days)))),
+        'EQ_Low': np.minimum(open_, close) * (1 - np.abs(rng.normal(0, daily_volatility / 3, len(days)))),
+        'EQ_Close': close,
+    })
+
+# Strike spacing: the 1-2-5 step closest below spot * spacing, at least 1
+def strike_steps(spot_price, spacing=0.01):
+    target = max(spot_price * spacing, 1.0)
+    power = 10.0 ** np.floor(np.log10(target))
+    return 5 * power if target >= 5 * power else 2 * power if target >= 2 * power else power
+
+def generate_option_chain(name, days, spot_prices, strikes_per_day=20, volatility=0.3, missing_rate=0.01, risk_free_rate=0.07, rng=None):
+    rng = rng if rng is not None else np.random.default_rng()
+    expiries = last_thursday_of_month_array(days)
+    rolled = days > expiries
+    expiries[rolled] = last_thursday_of_month_array(expiries[rolled] + 28)
+    time_to_maturity = np.maximum((expiries - days).astype(np.int64), 0.5) / 365.0
+
+    # Each expiry lists one strike grid for its whole cycle, as exchanges do: strikes_per_day
+    # strikes around the money, widened to cover the spot range of the cycle, so a contract
+    # stays quoted until its expiry. One row per (day, strike, type).
+    width = strikes_per_day // 2
+    day_index, strikes = [], []
+    for expiry in np.unique(expiries):
+        cycle = np.flatnonzero(expiries == expiry)
+        step = strike_steps(spot_prices[cycle[0]])
+        low = max(np.floor(spot_prices[cycle].min() / step) - width, 1) * step
+        high = (np.ceil(spot_prices[cycle].max() / step) + width) * step
+        grid = np.arange(low, high + step / 2, step)
+        day_index.append(np.repeat(cycle, len(grid)))
+        strikes.append(np.tile(grid, len(cycle)))
+    day_index, strikes = np.repeat(np.concatenate(day_index), 2), np.repeat(np.concatenate(strikes), 2)
+    is_call = np.tile([True, False], len(strikes) // 2)
+    keep = rng.random(len(strikes)) >= missing_rate
+    day_index, strikes, is_call = day_index[keep], strikes[keep], is_call[keep]
+
+    S, T = spot_prices[day_index], time_to_maturity[day_index]
+    d1 = (np.log(S / strikes) + (risk_free_rate + 0.5 * volatility ** 2) * T) / (volatility * np.sqrt(T))
+    d2 = d1 - volatility * np.sqrt(T)
+    discounted = strikes * np.exp(-risk_free_rate * T)
+    price = np.where(is_call, S * si.norm.cdf(d1) - discounted * si.norm.cdf(d2), discounted * si.norm.cdf(-d2) - S * si.norm.cdf(-d1))
+    price = np.maximum(price, 0.05)
+    noise = rng.normal(0, 0.08, (3, len(price)))
+    open_, close = price * (1 + noise[0]), price * (1 + noise[1])
+
+    expiry_labels = pd.DatetimeIndex(expiries).strftime('%d%b%y').str.upper().to_numpy()
+    tickers = (name + '-' + pd.Series(expiry_labels[day_index]) + '-' + pd.Series(strikes.astype(np.int64).astype(str))
+               + pd.Series(np.where(is_call, 'CE', 'PE'))).to_numpy()
+    return pd.DataFrame({
+        'Date': np.datetime_as_string(days)[day_index],
+        'Ticker': tickers,
+        'Open': np.maximum(open_, 0.05),
+        'High': np.maximum(np.maximum(open_, close), 0.05) * (1 + np.abs(noise[2])),
+        'Low': np.maximum(np.minimum(open_, close) * 0.95, 0.05),
+        'Close': np.maximum(close, 0.05),
+        'Volume': rng.integers(1, 5000, len(price)),
+    })
+
+# Write a full dataset under data_dir; tickers default to SYN00, SYN01, ...
+def generate_dataset(data_dir, tickers=2, years=3, strikes_per_day=20, start_date='2018-01-01', seed=0, nifty=True,
+                     holiday_rate=0.025, missing_rate=0.01):
+    rng = np.random.default_rng(seed)
+    if isinstance(tickers, int):
+        tickers = [f'SYN{number:02d}' for number in range(tickers)]
+    days = trading_days(start_date, years, holiday_rate, rng)
+    os.makedirs(f'{data_dir}/Stocks_Data', exist_ok=True)
+    for ticker in tickers:
+        equity_data = generate_equity(f'{ticker}.EQ-NSE', days, rng.uniform(100, 5000), rng=rng)
+        options_data = generate_option_chain(ticker, days, equity_data['EQ_Close'].to_numpy(), strikes_per_day, missing_rate=missing_rate, rng=rng)
+        equity_data.to_csv(f'{data_dir}/Stocks_Data/{ticker}_EQ_EOD.csv', index=False)
+        options_data.to_csv(f'{data_dir}/Stocks_Data/{ticker}_Opt_EOD.csv', index=False)
+    if nifty:
+        index_data = generate_equity('NIFTY', days, 11000.0, daily_volatility=0.01, rng=rng)
+        options_data = generate_option_chain('NIFTY', days, index_data['EQ_Close'].to_numpy(), strikes_per_day, volatility=0.15,
+                                             missing_rate=missing_rate, rng=rng)
+        index_data = index_data.drop(columns='Ticker').rename(columns=lambda column: column.replace('EQ_', ''))
+        index_data.to_csv(f'{data_dir}/nifty_combined_sorted_data.csv', index=False)
+        options_data.to_pickle(f'{data_dir}/Nifty_MonthlyI_Opt2019.pkl')
+    return tickers
+
+if __name__ == "__main__":
+    import sys
+    data_dir = sys.argv[1] if len(sys.argv) > 1 else 'Synthetic_Data'
+    tickers = generate_dataset(data_dir)
+    print(f"Wrote {len(tickers)} tickers and Nifty data to {data_dir}")
@@ -0,0 +1,41 @@
+# conftest.py
+import os
+import sys
+import pandas as pd
+import pytest
+
+# The modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from synthetic_data import generate_dataset
+from utilities import parse_option_tickers
+
+
+# Two synthetic tickers (with 5% of their quotes missing) and the Nifty data, generated once per session
+@pytest.fixture(scope='session')
+def dataset(tmp_path_factory):
+    data_dir = str(tmp_path_factory.mktemp('data'))
+    tickers = generate_dataset(data_dir, tickers=2, years=2, strikes_per_day=15, seed=5, missing_rate=0.05)
+    return data_dir, tickers
+
+def read_ticker(data_dir, ticker):
+    # (stock ticker, equity frame, parsed options frame, start date, end date)
+    equity_data = pd.read_csv(f'{data_dir}/Stocks_Data/{ticker}_EQ_EOD.csv')
+    options_data = parse_option_tickers(pd.read_csv(f'{data_dir}/Stocks_Data/{ticker}_Opt_EOD.csv'))
+    return f'{ticker}.EQ-NSE', equity_data, options_data, equity_data['Date'].iloc[0], equity_data['Date'].iloc[-1]
+
+@pytest.fixture(scope='session')
+def ticker_data(dataset):
+    data_dir, tickers = dataset
+    return read_ticker(data_dir, tickers[0])
+
+@pytest.fixture(scope='session')
+def universe_data(dataset):
+    data_dir, tickers = dataset
+    return [read_ticker(data_dir, ticker) for ticker in tickers]
+
+@pytest.fixture(scope='session')
+def nifty_data(dataset):
+    # (Nifty options frame, Nifty index frame)
+    data_dir, _ = dataset
+    return pd.read_pickle(f'{data_dir}/Nifty_MonthlyI_Opt2019.pkl'), pd.read_csv(f'{data_dir}/nifty_combined_sorted_data.csv')
@@ -0,0 +1,41 @@
+# test_data_cache.py
+import os
+import pandas as pd
+
+from data_cache import load_cached, cache_entry_path, read_meta, source_signature
+
+
+def write_equity(path, closes):
+    pd.DataFrame({'Date': pd.bdate_range('2020-01-01', periods=len(closes)).strftime('%Y-%m-%d'), 'Ticker': 'AAA.EQ-NSE',
+                  'EQ_Close': closes}).to_csv(path, index=False)
+
+
+def test_entry_is_reused_while_source_unchanged(tmp_path):
+    path = str(tmp_path / 'AAA_EQ_EOD.csv')
+    write_equity(path, [1.0, 2.0, 3.0])
+    calls = []
+    reader = lambda path: calls.append(path) or pd.read_csv(path)
+    first = load_cached(path, reader=reader)
+    second = load_cached(path, reader=reader)
+    assert len(calls) == 1
+    assert second['EQ_Close'].tolist() == first['EQ_Close'].tolist() == [1.0, 2.0, 3.0]
+    assert second['Date'].tolist() == first['Date'].tolist()
+
+
+# A source whose mtime changes (even to the same size) invalidates its entry, which is rebuilt
+def test_entry_is_rebuilt_after_source_changes(tmp_path):
+    path = str(tmp_path / 'AAA_EQ_EOD.csv')
+    write_equity(path, [1.0, 2.0, 3.0])
+    load_cached(path)
+    built = read_meta(cache_entry_path(path))['source']
+
+    write_equity(path, [4.0, 5.0, 6.0])
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, built['mtime_ns'] + 10 ** 9))
+    assert source_signature(path)['size'] == built['size']
+
+    data = load_cached(path)
+    assert data['EQ_Close'].tolist() == [4.0, 5.0, 6.0]
+    assert read_meta(cache_entry_path(path))['source'] == source_signature(path)
+    assert load_cached(path, columns=['EQ_Close'])['EQ_Close'].tolist() == [4.0, 5.0, 6.0]
+    assert not [name for name in os.listdir(tmp_path / '.cache') if name.endswith('.tmp')]
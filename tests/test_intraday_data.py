@@ -0,0 +1,76 @@
+# test_intraday_data.py
+import numpy as np
+import pandas as pd
+import pytest
+
+from intraday_data import INTRADAY_COLUMNS, date_offset, iter_days, IntradayReader
+
+
+# A small minute-bar file: weekdays of Jan-Feb 2020 without 2020-01-15, two contracts, a varying
+# number of bars a day, sorted by Date and Time
+@pytest.fixture(scope='module')
+def intraday_file(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    rows = []
+    for date in pd.bdate_range('2020-01-01', '2020-02-28').strftime('%Y-%m-%d'):
+        if date == '2020-01-15':
+            continue
+        times = pd.date_range('09:15', '15:29', freq='min').strftime('%H:%M')[::rng.integers(20, 90)]
+        for time in times:
+            for strike in (100, 110):
+                rows.append((date, time, f'AAA-JAN-{strike}CE', 1.0, 2.0, 1.5))
+    path = tmp_path_factory.mktemp('intraday') / 'AAA_Opt_1min.csv'
+    pd.DataFrame(rows, columns=INTRADAY_COLUMNS).to_csv(path, index=False)
+    return str(path)
+
+def first_row_date(path, start_date):
+    with open(path, 'rb') as f:
+        f.seek(date_offset(f, start_date))
+        line = f.readline()
+    return line.split(b',')[0].decode() if line else None
+
+
+@pytest.mark.parametrize('start_date, expected', [
+    ('2019-12-01', '2020-01-01'),  # before the file: its first row
+    ('2020-01-21', '2020-01-21'),  # mid-file, on a day with bars
+    ('2020-01-15', '2020-01-16'),  # a day without bars: the next one
+    ('2020-01-18', '2020-01-20'),  # a weekend
+    ('2020-02-28', '2020-02-28'),  # the last day
+    ('2020-03-02', None),          # after the file: end of file
+])
+def test_date_offset(intraday_file, start_date, expected):
+    assert first_row_date(intraday_file, start_date) == expected
+
+
+@pytest.mark.parametrize('start_date', ['2020-01-21', '2020-01-15', '2020-03-02'])
+def test_iter_days_from_start_date(intraday_file, start_date):
+    full = list(iter_days(intraday_file, chunksize=50))
+    part = list(iter_days(intraday_file, chunksize=50, start_date=start_date))
+    expected = [(date, bars) for date, bars in full if date >= start_date]
+    assert [date for date, _ in part] == [date for date, _ in expected]
+    assert all(bars.equals(expected_bars) for (_, bars), (_, expected_bars) in zip(part, expected))
+
+
+# Chunks far smaller than a day (and not aligned with days) still give each day whole, once
+@pytest.mark.parametrize('chunksize', [7, 33, 100000])
+def test_iter_days_reassembles_days_split_across_chunks(intraday_file, chunksize):
+    data = pd.read_csv(intraday_file, dtype={'Date': str, 'Time': str})
+    days = list(iter_days(intraday_file, chunksize=chunksize))
+    assert [date for date, _ in days] == list(data['Date'].unique())
+    for date, bars in days:
+        day = data[data['Date'] == date]
+        assert bars['Time'].tolist() == day['Time'].tolist()
+        assert (bars['Strike Price'].to_numpy() == day['Ticker'].str[-5:-2].astype(float).to_numpy()).all()
+
+
+def test_reader_serves_days_forward(intraday_file):
+    reader = IntradayReader(intraday_file, chunksize=13, start_date='2020-01-10')
+    try:
+        assert len(reader.bars('2020-01-13'))
+        assert len(reader.bars('2020-01-15')) == 0
+        bars = reader.contract_bars('2020-01-16', 110.0)
+        assert len(bars['Time']) and (bars['Close'] == np.float32(1.5)).all()
+        with pytest.raises(ValueError):
+            reader.bars('2020-01-14')
+    finally:
+        reader.close()
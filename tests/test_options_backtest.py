@@ -0,0 +1,21 @@
+# test_options_backtest.py
+import pytest
+
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_nifty import backtest_options as backtest_options_nifty
+from instrumentation import BacktestStats
+
+
+# The kernel refuses the loop engine's options instead of silently running without them
+@pytest.mark.parametrize('options', [dict(state={}), dict(stats=BacktestStats()), dict(volatility_source="implied"),
+                                     dict(intraday_data={'stock': object()})])
+def test_kernel_refuses_loop_options(ticker_data, nifty_data, options):
+    stock_ticker, equity_data, options_data, start_date, end_date = ticker_data
+    option_chain = OptionChainIndex(options_data)
+    with pytest.raises(ValueError):
+        backtest_options(stock_ticker, equity_data, option_chain, start_date, end_date, 700000, 20, engine="kernel", **options)
+    nifty_options_data, nifty_index_data = nifty_data
+    with pytest.raises(ValueError):
+        backtest_options_nifty(stock_ticker, equity_data, option_chain, OptionChainIndex(nifty_options_data.copy()), nifty_index_data,
+                               start_date, end_date, 700000, 20, engine="kernel", **options)
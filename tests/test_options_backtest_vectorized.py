@@ -0,0 +1,26 @@
+# test_options_backtest_vectorized.py
+import numpy as np
+import pytest
+
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_vectorized import backtest_options_vectorized
+from tradebook import trades_to_records
+
+
+# The vectorized engine reproduces the loop engine's tradebook, missing quotes included, and
+# its runs on a shared chain reuse the price paths built by the first one
+@pytest.mark.parametrize('option_type', ['call', 'put'])
+@pytest.mark.parametrize('reentry_type', ['asap', 'cost'])
+def test_vectorized_matches_loop(ticker_data, option_type, reentry_type):
+    stock_ticker, equity_data, options_data, start_date, end_date = ticker_data
+    option_chain = OptionChainIndex(options_data)
+    for sl in (0.2, 0.5, 2):
+        for max_reentries in (0, 2):
+            params = dict(dte=20, sl=sl, target_delta=0.3, max_reentries=max_reentries, reentry_type=reentry_type, option_type=option_type)
+            records = trades_to_records(backtest_options(stock_ticker, equity_data, option_chain, start_date, end_date, 700000, **params))
+            vectorized = trades_to_records(backtest_options_vectorized(stock_ticker, equity_data, option_chain, start_date, end_date, 700000, **params))
+            assert len(records)
+            assert records.dtype == vectorized.dtype and len(records) == len(vectorized)
+            assert all(np.array_equal(records[name], vectorized[name]) for name in records.dtype.names)
+    assert len(option_chain.prepared) == 1
@@ -0,0 +1,32 @@
+# test_options_kernel.py
+import numpy as np
+import pytest
+
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_nifty import backtest_options as backtest_options_nifty
+from tradebook import trades_to_records
+
+
+PARAMS = [dict(dte=20, sl=2, target_delta=0.3, max_reentries=1, reentry_type='asap'),
+          dict(dte=20, sl=0.5, target_delta=0.3, max_reentries=2, reentry_type='cost'),
+          dict(dte=15, sl=0.3, target_delta=0.25, max_reentries=3, reentry_type='asap', option_type='put')]
+
+
+# The compiled kernel reproduces the loop engines' tradebooks, missing quotes included
+@pytest.mark.parametrize('hedged', [False, True])
+@pytest.mark.parametrize('params', PARAMS)
+def test_kernel_matches_loop(ticker_data, nifty_data, hedged, params):
+    stock_ticker, equity_data, options_data, start_date, end_date = ticker_data
+    option_chain = OptionChainIndex(options_data)
+    if hedged:
+        nifty_options_data, nifty_index_data = nifty_data
+        nifty_chain = OptionChainIndex(nifty_options_data.copy())
+        run = lambda engine: backtest_options_nifty(stock_ticker, equity_data, option_chain, nifty_chain, nifty_index_data, start_date, end_date,
+                                                    700000, engine=engine, **params)
+    else:
+        run = lambda engine: backtest_options(stock_ticker, equity_data, option_chain, start_date, end_date, 700000, engine=engine, **params)
+    records, kernel_records = trades_to_records(run("loop"), hedged), trades_to_records(run("kernel"), hedged)
+    assert len(records)
+    assert records.dtype == kernel_records.dtype and len(records) == len(kernel_records)
+    assert all(np.array_equal(records[name], kernel_records[name]) for name in records.dtype.names)
@@ -0,0 +1,36 @@
+# test_options_panel.py
+import numpy as np
+import pytest
+
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_nifty import backtest_options as backtest_options_nifty
+from options_panel import backtest_options_panel
+from tradebook import trades_to_records
+
+
+PARAMS = [dict(dte=20, sl=0.5, target_delta=0.3, max_reentries=2, reentry_type='asap', option_type='call'),
+          dict(dte=15, sl=0.3, target_delta=0.35, max_reentries=1, reentry_type='cost', option_type='put')]
+
+
+# Every ticker's panel tradebook is the one of its own loop run, with and without the Nifty hedge
+@pytest.mark.parametrize('hedged', [False, True])
+@pytest.mark.parametrize('params', PARAMS)
+def test_panel_matches_loop(universe_data, nifty_data, hedged, params):
+    universe = [(stock_ticker, equity_data, OptionChainIndex(options_data), start_date, end_date)
+                for stock_ticker, equity_data, options_data, start_date, end_date in universe_data]
+    nifty_options_data, nifty_index_data = nifty_data
+    nifty_chain = OptionChainIndex(nifty_options_data.copy())
+    if hedged:
+        panel_trades = backtest_options_panel(universe, 700000, nifty_options_data=nifty_chain, nifty_index_data=nifty_index_data, **params)
+    else:
+        panel_trades = backtest_options_panel(universe, 700000, **params)
+    for stock_ticker, equity_data, option_chain, start_date, end_date in universe:
+        if hedged:
+            trades = backtest_options_nifty(stock_ticker, equity_data, option_chain, nifty_chain, nifty_index_data, start_date, end_date, 700000, **params)
+        else:
+            trades = backtest_options(stock_ticker, equity_data, option_chain, start_date, end_date, 700000, **params)
+        records, panel_records = trades_to_records(trades, hedged), trades_to_records(panel_trades[stock_ticker], hedged)
+        assert len(records)
+        assert records.dtype == panel_records.dtype and len(records) == len(panel_records)
+        assert all(np.array_equal(records[name], panel_records[name]) for name in records.dtype.names)
@@ -0,0 +1,29 @@
+# test_options_strategy.py
+import numpy as np
+import pytest
+
+from option_chain import OptionChainIndex
+from options_strategy import Leg, Strategy, backtest_strategy, short_option_strategy
+from tradebook import trades_to_records
+
+
+def same_records(records, reference):
+    return len(records) == len(reference) and all(np.array_equal(records[name], reference[name]) for name in reference.dtype.names)
+
+
+# A leg's trades in a multi-leg run are those of the leg run on its own: a day one leg skips
+# (no quote for its contract) does not hold back the other leg's checks or expiry close
+@pytest.mark.parametrize('params', [dict(sl=0.5, max_reentries=2, reentry_type='asap'), dict(sl=0.3, max_reentries=1, reentry_type='cost')])
+def test_legs_trade_as_single_leg_runs(ticker_data, params):
+    stock_ticker, equity_data, options_data, start_date, end_date = ticker_data
+    option_chain = OptionChainIndex(options_data)
+    legs = [Leg('Call', 'stock', 'call', 0.3, sl=params['sl']), Leg('Put', 'stock', 'put', 0.3, sl=params['sl'])]
+    strategy = Strategy(legs, 20, params['max_reentries'], params['reentry_type'])
+    records = trades_to_records(backtest_strategy(strategy, stock_ticker, equity_data, option_chain, start_date, end_date, 700000))
+    assert set(records['Leg']) == {'Call', 'Put'}
+    for leg in legs:
+        single = short_option_strategy(20, target_delta=0.3, option_type=leg.option_type, **params)
+        reference = trades_to_records(backtest_strategy(single, stock_ticker, equity_data, option_chain, start_date, end_date, 700000))
+        leg_records = records[records['Leg'] == leg.name]
+        assert len(reference)
+        assert same_records(leg_records[list(reference.dtype.names)], reference)
@@ -0,0 +1,60 @@
+# test_strategy_state.py
+import numpy as np
+import pandas as pd
+import pytest
+
+import volatility
+from option_chain import OptionChainIndex
+from options_backtest import backtest_options
+from options_backtest_nifty import backtest_options as backtest_options_nifty
+from strategy_state import save_state, load_state, state_path, config_key
+from tradebook import trades_to_records
+
+
+def run(stock_ticker, equity_data, options_data, nifty_data, start_date, end_date, params, state=None):
+    if nifty_data is None:
+        trades = backtest_options(stock_ticker, equity_data, OptionChainIndex(options_data), start_date, end_date, 700000, state=state, **params)
+    else:
+        nifty_options_data, nifty_index_data = nifty_data
+        trades = backtest_options_nifty(stock_ticker, equity_data, OptionChainIndex(options_data), OptionChainIndex(nifty_options_data),
+                                        nifty_index_data, start_date, end_date, 700000, state=state, **params)
+    return trades_to_records(trades, nifty_data is not None)
+
+def until(data, date, since=None):
+    # Rows dated up to date (and from since, when given)
+    dates = data['Date']
+    return data[(dates <= date) & (dates >= since if since is not None else True)].reset_index(drop=True)
+
+
+# A bootstrap run followed by one update per new day, the state going through its JSON file in
+# between and each update seeing only a month of history, trades exactly as one full run
+@pytest.mark.parametrize('hedged', [False, True])
+@pytest.mark.parametrize('params', [dict(dte=20, sl=0.5, target_delta=0.3, max_reentries=2, reentry_type='asap'),
+                                    dict(dte=15, sl=1, target_delta=0.35, max_reentries=1, reentry_type='cost', option_type='put')])
+def test_incremental_runs_match_full_run(ticker_data, nifty_data, tmp_path, hedged, params):
+    stock_ticker, equity_data, options_data, start_date, _ = ticker_data
+    days = list(equity_data['Date'].unique())
+    end_date = days[-80]
+    nifty_options_data, nifty_index_data = nifty_data
+    nifty = lambda date, since=None: (until(nifty_options_data, date, since), until(nifty_index_data, date, since)) if hedged else None
+
+    volatility.volatility_cache.clear()
+    full = run(stock_ticker, until(equity_data, end_date), until(options_data, end_date), nifty(end_date), start_date, end_date, params)
+
+    volatility.volatility_cache.clear()
+    bootstrap_date = days[-130]
+    state = {}
+    parts = [run(stock_ticker, until(equity_data, bootstrap_date), until(options_data, bootstrap_date), nifty(bootstrap_date),
+                 start_date, bootstrap_date, params, state)]
+    path = state_path(stock_ticker, params, str(tmp_path))
+    for date in days[days.index(bootstrap_date) + 1:days.index(end_date) + 1]:
+        save_state(path, state, params)
+        state = load_state(path)
+        since = (pd.Timestamp(state['last_date']) - pd.Timedelta(days=30)).strftime('%Y-%m-%d')
+        parts.append(run(stock_ticker, until(equity_data, date, since), until(options_data, date, since), nifty(date, since),
+                         start_date, date, params, state))
+    incremental = np.concatenate(parts)
+
+    assert len(full) and config_key(params) in path
+    assert incremental.dtype == full.dtype and len(incremental) == len(full)
+    assert all(np.array_equal(incremental[name], full[name]) for name in full.dtype.names)
@@ -0,0 +1,192 @@
+# tradebook.py
+import os
+import numpy as np
+import pandas as pd
+
+# tradebook.py
+#
+# Compact tradebook records and a streaming aggregator for the runners. The backtests append
+# their trades to a TradeBook, one NumPy structured array with a fixed schema, so a worker sends
+# back a single buffer (or saves it as a per-worker .npy shard) instead of a DataFrame or a
+# list of dicts, and the parent folds each batch into
+# monthly PnL totals and appends it to the tradebook CSV as it arrives, so it never holds the
+# whole tradebook or re-concatenates it per result.
+
+TRADE_FIELDS = [('ticker', 'U32'), ('Option Open Date', 'U10'), ('Spot Price', 'f8'), ('Option Strike', 'f4'),
+                ('Option Initial Price', 'f8'), ('Option Final Price', 'f8'), ('Option Close Date', 'U10'),
+                ('Options PNL', 'f8'), ('lot_size', 'f8')]
+STATUS_FIELDS = [('Options SL', 'i8'), ('Re-entry', '?'), ('Reentry Count', 'i8'), ('Option SL', 'U16')]
+
+
+# Columns of a hedge leg closed together with the traded option, named after the leg. The
+# close date column is never filled (the trade's Option Close Date is the hedge's).
+def hedge_fields(name):
+    return [(f'{name} Spot Price', 'f8'), (f'{name} Option Strike', 'f4'), (f'{name} Option Final Price', 'f8'),
+            (f'{name} Option Initial Price', 'f8'), (f'{name} Option Close Date', 'i8'), (f'{name} lot_size', 'f8'),
+            (f'{name} Options PNL', 'f8')]
+
+NIFTY_TRADE_FIELDS = hedge_fields('Nifty')
+
+
+# Record dtype of a tradebook, in the backtests' column order. hedges names the hedge legs
+# (hedged=True is the Nifty one), leg_column adds the 'Leg' column of strategies trading more
+# than one leg, extra adds constant columns (e.g. a sweep's parameters) typed from their values.
+def trade_dtype(hedged=False, extra=None, hedges=None, leg_column=False):
+    hedges = hedges if hedges is not None else (['Nifty'] if hedged else [])
+    fields = TRADE_FIELDS + [field for name in hedges for field in hedge_fields(name)] + STATUS_FIELDS
+    if leg_column:
+        fields = fields + [('Leg', 'U16')]
+    return np.dtype(fields + extra_fields(extra))
+
+def extra_fields(extra):
+    return [(name, np.asarray(value).dtype) for name, value in extra.items()] if extra else []
+
+
+class TradeBook:
+    # Append-only tradebook over a preallocated structured array with the trade_dtype schema.
+    # append() copies a position's fields into the next row, so the backtest can go on mutating
+    # its position dict without deep-copying it first. Iterating yields one dict per trade.
+    # dtype overrides the schema (a strategy's, see options_strategy.py).
+    def __init__(self, hedged=False, capacity=64, dtype=None):
+        self.hedged = hedged
+        self.dtype = dtype if dtype is not None else trade_dtype(hedged)
+        self.defaults = tuple('' if self.dtype[name].kind == 'U' else 0 for name in self.dtype.names)
+        self.buffer = np.zeros(capacity, dtype=self.dtype)
+        self.size = 0
+
+    @classmethod
+    def from_columns(cls, columns, size, hedged=False):
+        # Whole columns at once (scalars broadcast); fields not given keep their zero default
+        tradebook = cls(hedged, capacity=max(size, 1))
+        for name, values in columns.items():
+            tradebook.buffer[name][:size] = values
+        tradebook.size = size
+        return tradebook
+
+    def append(self, position):
+        if self.size == len(self.buffer):
+            self.buffer = np.concatenate([self.buffer, np.zeros(len(self.buffer), dtype=self.dtype)])
+        self.buffer[self.size] = tuple(position.get(name, default) for name, default in zip(self.dtype.names, self.defaults))
+        self.size += 1
+
+    @property
+    def records(self):
+        return self.buffer[:self.size]
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for record in self.records:
+            yield {name: record[name] for name in self.dtype.names}
+
+    def to_frame(self):
+        return records_to_frame(self.records)
+
+
+# Trades from backtest_options (either variant) to a structured array; trade dicts are
+# copied into one, a TradeBook's records are used as they are
+def trades_to_records(trades, hedged=False, extra=None):
+    if isinstance(trades, TradeBook) and not extra:
+        return trades.records
+    if isinstance(trades, TradeBook):
+        dtype = np.dtype(trades.dtype.descr + extra_fields(extra))
+    else:
+        dtype = trade_dtype(hedged, extra)
+    records = np.zeros(len(trades), dtype=dtype)
+    if len(trades):
+        for name in dtype.names:
+            if extra and name in extra:
+                records[name] = extra[name]
+            elif isinstance(trades, TradeBook):
+                records[name] = trades.records[name]
+            else:
+                records[name] = [trade.get(name, '' if dtype[name].kind == 'U' else 0) for trade in trades]
+    return records
+
+# DataFrame over the record columns; numeric columns are views of the array, not copies
+def records_to_frame(records):
+    return pd.DataFrame({name: records[name] for name in records.dtype.names}, copy=False)
+
+# Per-worker shards: a worker saves its records and hands back only the path
+def write_shard(records, shard_dir, name):
+    os.makedirs(shard_dir, exist_ok=True)
+    path = os.path.join(shard_dir, f'{name}.npy')
+    np.save(path, records)
+    return path
+
+def read_shard(path):
+    return np.load(path, mmap_mode='r')
+
+
+class TradebookAggregator:
+    # Folds batches of records into per-month PnL totals as they arrive and, with path, streams
+    # them to the tradebook CSV. signs flips a column's sign in the totals only (buy mode), so
+    # the CSV keeps the backtest's raw values. Totals are kept per month, since batches arrive
+    # in ticker order rather than date order; drawdown and win/loss months are then read off
+    # the ordered monthly table. With append an existing tradebook at path is folded into the
+    # totals first and new batches are appended to it (incremental runs).
+    def __init__(self, pnl_columns=('Options PNL',), signs=None, path=None, append=False):
+        self.pnl_columns = list(pnl_columns)
+        self.signs = signs or {}
+        self.path = path
+        self.monthly = {}
+        self.trades = 0
+        self.written = False
+        if append and path is not None and os.path.exists(path):
+            for chunk in pd.read_csv(path, usecols=['Option Open Date'] + self.pnl_columns, chunksize=100000):
+                self.fold(chunk.to_records(index=False))
+            self.written = True
+
+    def add(self, records):
+        if isinstance(records, str):
+            records = read_shard(records)
+        if len(records) == 0:
+            return 0
+        if self.path is not None:
+            records_to_frame(records).to_csv(self.path, mode='a' if self.written else 'w', header=not self.written, index=False)
+            self.written = True
+        self.fold(records)
+        return len(records)
+
+    def fold(self, records):
+        # Add records to the monthly totals only
+        if len(records) == 0:
+            return
+        months, inverse = np.unique(records['Option Open Date'].astype('U7'), return_inverse=True)
+        sums = np.stack([np.bincount(inverse, weights=records[column] * self.signs.get(column, 1), minlength=len(months))
+                         for column in self.pnl_columns], axis=1)
+        for month, month_sums in zip(months, sums):
+            if month in self.monthly:
+                self.monthly[month] += month_sums
+            else:
+                self.monthly[month] = month_sums.copy()
+        self.trades += len(records)
+
+    def close(self, columns=None):
+        # An empty run still leaves a (header-only) tradebook file
+        if self.path is not None and not self.written:
+            pd.DataFrame(columns=columns).to_csv(self.path, index=False)
+            self.written = True
+
+    def monthly_pnl(self):
+        months = sorted(self.monthly)
+        monthly_pnl_df = pd.DataFrame([self.monthly[month] for month in months], columns=self.pnl_columns)
+        monthly_pnl_df.insert(0, 'Month', pd.PeriodIndex(months, freq='M'))
+        return monthly_pnl_df
+
+    def yearly_pnl(self):
+        monthly_pnl_df = self.monthly_pnl()
+        return monthly_pnl_df.groupby(monthly_pnl_df['Month'].dt.year.rename('Year'))[self.pnl_columns].sum().reset_index()
+
+    def total_pnl(self):
+        return sum(self.monthly.values(), np.zeros(len(self.pnl_columns))).sum()
+
+    def max_drawdown(self):
+        cumulative_pnl = self.monthly_pnl()[self.pnl_columns].sum(axis=1).cumsum()
+        return (cumulative_pnl - cumulative_pnl.cummax()).min()
+
+    def month_counts(self, column='Options PNL'):
+        # (positive months, negative months) of one PnL column
+        values = self.monthly_pnl()[column]
+        return int((values > 0).sum()), int((values < 0).sum())
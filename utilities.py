@@ -17,6 +17,13 @@ def calculate_historical_volatility(equity_data, lookback_period=252):
     equity_data['Volatility'] = volatility
     return equity_data
 
+def calculate_historical_volatility_nifty(index_data, lookback_period=252):
+    index_data['Log_Return'] = np.log(index_data['Close'] / index_data['Close'].shift(1))
+    rolling_std = index_data['Log_Return'].rolling(window=lookback_period).std()
+    volatility = rolling_std * np.sqrt(252)  # Annualize the standard deviation
+    index_data['Volatility'] = volatility
+    return index_data
+
 def calculate_greeks(S, K, T, r, sigma, option_type='call'):
     d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * np.sqrt(T))
     d2 = d1 - sigma * np.sqrt(T)
@@ -28,6 +35,31 @@ def calculate_greeks(S, K, T, r, sigma, option_type='call'):
 
     return delta
 
+def calculate_greeks_vectorized(S, K, T, r, sigma, option_type='call'):
+    # Black-Scholes greeks for whole arrays in one call. Inputs broadcast, so a chain is
+    # strikes K against scalar S/T/sigma, and many dates at once is S/T/sigma as column
+    # vectors against a 2-D strike grid. option_type may also be an array of 'call'/'put'.
+    # Vega is per 1.00 of volatility and theta per year.
+    S = np.asarray(S, dtype=np.float64)
+    K = np.asarray(K, dtype=np.float64)
+    T = np.asarray(T, dtype=np.float64)
+    sigma = np.asarray(sigma, dtype=np.float64)
+    is_call = np.asarray(option_type) == 'call'
+
+    sqrt_T = np.sqrt(T)
+    d1 = (np.log(S / K) + (r + 0.5 * sigma ** 2) * T) / (sigma * sqrt_T)
+    d2 = d1 - sigma * sqrt_T
+    pdf_d1 = norm.pdf(d1)
+    discount = K * np.exp(-r * T)
+
+    delta = np.where(is_call, norm.cdf(d1), -norm.cdf(-d1))
+    gamma = pdf_d1 / (S * sigma * sqrt_T)
+    vega = S * pdf_d1 * sqrt_T
+    theta = np.where(is_call,
+                     -S * pdf_d1 * sigma / (2 * sqrt_T) - r * discount * norm.cdf(d2),
+                     -S * pdf_d1 * sigma / (2 * sqrt_T) + r * discount * norm.cdf(-d2))
+    return {'delta': delta, 'gamma': gamma, 'vega': vega, 'theta': theta}
+
 def calculate_time_to_maturity(date):
     date_obj = datetime.strptime(date, "%Y-%m-%d")
     expiry_date = last_thursday_of_month(date_obj)
@@ -40,11 +72,26 @@ def last_thursday_of_month(date):
     last_thursday = last_day - timedelta(days=(last_day.weekday() - 3) % 7)
     return last_thursday
 
+# Vectorized versions of the three functions above over a datetime64[D] timeline
+def last_thursday_of_month_array(days):
+    month_ends = (days.astype('datetime64[M]') + 1).astype('datetime64[D]') - 1
+    weekdays = (month_ends.astype(np.int64) + 3) % 7  # 1970-01-01 was a Thursday, Monday = 0
+    return month_ends - (weekdays - 3) % 7
+
+def calculate_time_to_maturity_array(days):
+    return (last_thursday_of_month_array(days) - days).astype(np.int64) / 365.0
+
+def calculate_time_to_expiry_array(days):
+    last_thursday_current_month = last_thursday_of_month_array(days)
+    last_thursday_next_month = last_thursday_of_month_array(last_thursday_current_month + 28)
+    return np.where(days > last_thursday_current_month, last_thursday_next_month - days, last_thursday_current_month - days).astype(np.int64)
+
 def simulate_futures_price(spot_price, time_to_maturity, risk_free_rate=0.07):
     return spot_price * np.exp(risk_free_rate * time_to_maturity)
 
 def get_option_price(options_data, strike_price, option_type='call', ohlc='Close'):
-    options_data[['Strike Price', 'Extracted Option Type']] = options_data['Ticker'].apply(extract_strike_price_and_type).apply(pd.Series)
+    if 'Strike Price' not in options_data.columns:
+        parse_option_tickers(options_data)
     option_row = options_data[(options_data['Strike Price'] == strike_price) & (options_data['Extracted Option Type'] == option_type)]
     return option_row[ohlc].values[0] if not option_row.empty else None
 
@@ -55,12 +102,28 @@ def extract_strike_price_and_type(ticker):
     option_type = 'call' if 'CE' in strike_and_type else 'put' if 'PE' in strike_and_type else None
     return float(strike_price), option_type
 
+def parse_option_tickers(options_data):
+    # Vectorized extract_strike_price_and_type over the whole frame, done once at load time.
+    # Each distinct ticker is parsed once and broadcast back to the rows through its code.
+    codes, tickers = pd.factorize(options_data['Ticker'])
+    strike_and_type = pd.Series(tickers, dtype=object).str.split('-').str[-1]
+    strikes = pd.to_numeric(strike_and_type.str.replace(r'\D', '', regex=True), errors='coerce').to_numpy(dtype=np.float32)
+    type_codes = np.where(strike_and_type.str.contains('CE', regex=False), 0,
+                          np.where(strike_and_type.str.contains('PE', regex=False), 1, -1)).astype(np.int8)
+    missing = codes < 0
+    options_data['Strike Price'] = np.where(missing, np.float32(np.nan), strikes[codes])
+    options_data['Extracted Option Type'] = pd.Categorical.from_codes(np.where(missing, -1, type_codes[codes]), categories=['call', 'put'])
+    return options_data
+
+def select_strike_by_delta(strikes, spot_price, time_to_maturity, volatility, target_delta, option_type='call', risk_free_rate=0.07):
+    # Position of the strike whose delta is closest to target_delta (first one on ties, like idxmin)
+    delta = calculate_greeks_vectorized(spot_price, strikes, time_to_maturity, risk_free_rate, volatility, option_type)['delta']
+    return np.nanargmin(np.abs(delta - target_delta))
+
 def find_option_by_delta(options_for_date, date, spot_price, time_to_maturity, volatility, target_delta, option_type='call'):
     options_for_date = options_for_date[options_for_date['Extracted Option Type'] == option_type]
-    options_for_date.loc[:, 'Calculated_Delta'] = options_for_date.apply(
-        lambda row: calculate_greeks(spot_price, row['Strike Price'], time_to_maturity, 0.07, volatility, option_type), axis=1)
-    options_for_date.loc[:, 'Delta_Diff'] = abs(options_for_date['Calculated_Delta'] - target_delta)
-    return options_for_date.loc[options_for_date['Delta_Diff'].idxmin()]
+    position = select_strike_by_delta(options_for_date['Strike Price'].to_numpy(), spot_price, time_to_maturity, volatility, target_delta, option_type)
+    return options_for_date.iloc[position]
 
 def calculate_time_to_expiry(current_date_str):
     # Convert string date to datetime object
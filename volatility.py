@@ -0,0 +1,166 @@
+# volatility.py
+import math
+from collections import deque
+import numpy as np
+
+ESTIMATORS = ('close', 'ewma', 'parkinson')
+
+
+class VolatilityProvider:
+    # Annualised volatility of one price series, built bar by bar so it can be extended with
+    # new bars without recomputing the history and without touching the caller's DataFrame.
+    #   close     - rolling std (ddof=1) of log close-to-close returns, the same series as
+    #               calculate_historical_volatility, kept with a sliding-window Welford update
+    #   ewma      - RiskMetrics exponentially weighted variance of log returns (decay ewma_lambda)
+    #   parkinson - rolling mean of ln(High/Low)^2 / (4 ln 2) over the window
+    # Values are NaN until the estimator has enough bars; filled() replaces them with fill_value.
+    def __init__(self, lookback_period=252, estimator='close', ewma_lambda=0.94, fill_value=0.3):
+        if estimator not in ESTIMATORS:
+            raise ValueError(f"Unknown volatility estimator: {estimator}")
+        self.lookback_period = lookback_period
+        self.estimator = estimator
+        self.ewma_lambda = ewma_lambda
+        self.fill_value = fill_value
+        self.values = []
+        self.dates = []
+        self.last_close = math.nan
+        self.window = deque()  # samples currently in the rolling window (NaN for missing ones)
+        self.count = 0         # non-NaN samples in the window
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.ewma_variance = math.nan
+        self.last_date = None  # last bar before values[0], for a provider restored with from_state
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, close, high=None, low=None, date=None):
+        # Add one bar and return its (unfilled) volatility
+        if self.estimator == 'parkinson':
+            sample = math.log(high / low) ** 2 / (4 * math.log(2)) if high and low else math.nan
+        else:
+            sample = math.log(close / self.last_close) if close > 0 and self.last_close > 0 else math.nan
+        self.last_close = close
+
+        if self.estimator == 'ewma':
+            if not math.isnan(sample):
+                if math.isnan(self.ewma_variance):
+                    self.ewma_variance = sample ** 2
+                else:
+                    self.ewma_variance = self.ewma_lambda * self.ewma_variance + (1 - self.ewma_lambda) * sample ** 2
+            volatility = math.sqrt(self.ewma_variance * 252)
+        else:
+            self.slide(sample)
+            if self.count < self.lookback_period:
+                volatility = math.nan
+            elif self.estimator == 'parkinson':
+                volatility = math.sqrt(self.mean * 252)
+            else:
+                volatility = math.sqrt(max(self.m2, 0.0) / (self.count - 1) * 252)
+
+        self.values.append(volatility)
+        self.dates.append(date)
+        return volatility
+
+    def extend(self, closes, highs=None, lows=None, dates=None):
+        for position, close in enumerate(closes):
+            self.append(close,
+                        highs[position] if highs is not None else None,
+                        lows[position] if lows is not None else None,
+                        dates[position] if dates is not None else None)
+        return self
+
+    def slide(self, sample):
+        # Welford update for a fixed-length window: add the new sample, drop the oldest
+        self.window.append(sample)
+        if not math.isnan(sample):
+            self.count += 1
+            delta = sample - self.mean
+            self.mean += delta / self.count
+            self.m2 += delta * (sample - self.mean)
+        if len(self.window) > self.lookback_period:
+            oldest = self.window.popleft()
+            if not math.isnan(oldest):
+                self.count -= 1
+                if self.count == 0:
+                    self.mean, self.m2 = 0.0, 0.0
+                else:
+                    delta = oldest - self.mean
+                    self.mean -= delta / self.count
+                    self.m2 -= delta * (oldest - self.mean)
+
+    def filled(self):
+        values = np.asarray(self.values, dtype=np.float64)
+        return np.where(np.isnan(values), self.fill_value, values)
+
+    def state(self):
+        # Everything the next bar's value depends on, as plain JSON-able values; the history
+        # itself (values, dates) is left out
+        return {'lookback_period': self.lookback_period, 'estimator': self.estimator, 'ewma_lambda': self.ewma_lambda,
+                'fill_value': self.fill_value, 'date': self.dates[-1] if self.dates else self.last_date, 'last_close': self.last_close,
+                'window': list(self.window), 'count': self.count, 'mean': self.mean, 'm2': self.m2, 'ewma_variance': self.ewma_variance}
+
+    @classmethod
+    def from_state(cls, state):
+        # A provider that continues exactly where the one state() was taken from stopped
+        provider = cls(state['lookback_period'], state['estimator'], state['ewma_lambda'], state['fill_value'])
+        provider.last_close = state['last_close']
+        provider.window = deque(state['window'])
+        provider.count = state['count']
+        provider.mean = state['mean']
+        provider.m2 = state['m2']
+        provider.ewma_variance = state['ewma_variance']
+        provider.last_date = state['date']
+        return provider
+
+
+# Providers cached per (key, column, estimator, lookback, EWMA decay, fill value) for the life
+# of the process, so repeated runs over the same series (sweeps, both legs of a ticker)
+# compute it once
+volatility_cache = {}
+
+def get_volatility(data, key=None, close_column='EQ_Close', estimator='close', lookback_period=252,
+                   high_column=None, low_column=None, fill_value=0.3, ewma_lambda=0.94):
+    # Volatility for every row of data, NaN filled with fill_value. data is only read.
+    # A cached provider whose dates are a prefix of data's dates is extended with the new rows.
+    if high_column is None:
+        high_column = close_column.replace('Close', 'High')
+    if low_column is None:
+        low_column = close_column.replace('Close', 'Low')
+    dates = data['Date'].tolist()
+    closes = data[close_column].to_numpy()
+    highs = data[high_column].to_numpy() if estimator == 'parkinson' else None
+    lows = data[low_column].to_numpy() if estimator == 'parkinson' else None
+
+    cache_key = (key, close_column, estimator, lookback_period, ewma_lambda, fill_value)
+    provider = volatility_cache.get(cache_key) if key is not None else None
+    if provider is None or len(provider) > len(dates) or provider.dates != dates[:len(provider)]:
+        provider = VolatilityProvider(lookback_period, estimator, ewma_lambda, fill_value)
+    start = len(provider)
+    if start < len(dates):
+        provider.extend(closes[start:],
+                        highs[start:] if highs is not None else None,
+                        lows[start:] if lows is not None else None,
+                        dates[start:])
+    if key is not None:
+        volatility_cache[cache_key] = provider
+    return provider.filled()
+
+# Close-to-close volatility of data's rows after the state's date, continuing the provider the
+# state was taken from (rows up to that date are fill_value); data must be sorted by Date
+def resume_volatility(state, data, close_column='EQ_Close'):
+    provider = VolatilityProvider.from_state(state)
+    dates = data['Date'].to_numpy()
+    start = int((dates <= provider.last_date).sum()) if provider.last_date is not None else 0
+    provider.extend(data[close_column].to_numpy()[start:], dates=dates[start:].tolist())
+    return np.r_[np.full(start, provider.fill_value), provider.filled()]
+
+# Provider state after data's rows up to last_date, continuing `state` when given (otherwise
+# from data's first row, as get_volatility computes it)
+def volatility_state(data, last_date, close_column='EQ_Close', state=None, lookback_period=252):
+    provider = VolatilityProvider.from_state(state) if state is not None else VolatilityProvider(lookback_period)
+    dates = data['Date'].to_numpy()
+    start = int((dates <= provider.last_date).sum()) if provider.last_date is not None else 0
+    stop = int((dates <= last_date).sum())
+    provider.extend(data[close_column].to_numpy()[start:stop], dates=dates[start:stop].tolist())
+    return provider.state()